@@ -259,14 +259,13 @@ class AcpApp(QMainWindow):
 
     def Clicked4(self):
         try:
-            n=N4J()
             self.ui.listWidget.setEnabled(False)
             self.ui.listWidget_2.setEnabled(False)
             self.ui.listWidget_3.setEnabled(False)
             self.ui.pushButton.setEnabled(False)
             self.update_statusbar('Processing query...')
 
-            self.products = n.get_rating_greater(
+            self.products = self.n4.get_rating_greater(
                 node=self.ui.listWidget.selectedItems()[0].text(),
                 prop_key=self.ui.listWidget_2.selectedItems()[0].text(),
                 rating=self.ui.spb_search_value.value(),
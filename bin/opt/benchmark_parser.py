@@ -0,0 +1,247 @@
+#! /usr/bin/python3
+
+import os
+import re
+import gc
+import sys
+import time
+
+project_root = re.sub('(?<=Amazon-CoPurchasing).*', '', os.path.abspath('.'))
+
+# Add reference path to access files in /lib/ (JR)
+sys.path.insert(0, os.path.join(project_root, 'lib'))
+
+from acpTokenizer import LineTokenizer
+
+# Fixed sample in the format of amazon-meta.txt (already sanitized as split_file() would leave it) (JR)
+sample_records = '''Id: 1
+ASIN: 0827229534
+title: Patterns of Preaching: A Sermon Sampler
+group: Book
+salesrank: 396585
+similar: 5 0804215715 156101074X 0687023955 0687074231 082721619X
+categories: 2
+|Books[283155]|Subjects[1000]|Religion & Spirituality[22]|Christianity[12290]|Clergy[12360]|Preaching[12368]
+|Books[283155]|Subjects[1000]|Religion & Spirituality[22]|Christianity[12290]|Clergy[12360]|Sermons[12370]
+reviews: total: 2 downloaded: 2 avg rating: 5
+2000-7-28 cutomer: A2JW67OY8U6HHK rating: 5 votes: 10 helpful: 9
+2003-12-14 cutomer: A2VE83MZF98ITY rating: 5 votes: 6 helpful: 5
+
+Id: 2
+ASIN: 0738700797
+title: Candlemas: Feast of Flames
+group: Book
+salesrank: 168596
+similar: 5 0738700827 1567184960 1567182836 0738700525 0738700940
+categories: 2
+|Books[283155]|Subjects[1000]|Religion & Spirituality[22]|Earth-Based Religions[12472]|Wicca[12484]
+|Books[283155]|Subjects[1000]|Religion & Spirituality[22]|Earth-Based Religions[12472]|Witchcraft[12486]
+reviews: total: 12 downloaded: 12 avg rating: 4.5
+2001-12-16 cutomer: A11NCO6YTE4BTJ rating: 5 votes: 5 helpful: 4
+2002-1-7 cutomer: A9CQ3PLRNIR83 rating: 4 votes: 5 helpful: 5
+2002-1-24 cutomer: A13SG9ACZ9O5IM rating: 5 votes: 8 helpful: 8
+2002-1-28 cutomer: A1BDAI6VEYMAZA rating: 5 votes: 4 helpful: 4
+2002-2-6 cutomer: A2P6KAWXJ16234 rating: 4 votes: 16 helpful: 16
+2002-2-14 cutomer: AMACWC3M7PQFR rating: 4 votes: 5 helpful: 5
+2002-3-23 cutomer: A3GO7UV9XX14D8 rating: 4 votes: 6 helpful: 6
+2002-5-23 cutomer: A1GIL64QK68WKL rating: 5 votes: 8 helpful: 8
+2003-2-25 cutomer: AEOBOF2ONQJWV rating: 5 votes: 8 helpful: 5
+2003-11-25 cutomer: A3IGHTES8ME05L rating: 5 votes: 5 helpful: 5
+2004-2-11 cutomer: A1CP26N8RHYVVO rating: 1 votes: 13 helpful: 9
+2005-2-7 cutomer: ANEIANH0WAT9D rating: 5 votes: 1 helpful: 1
+
+Id: 3
+ASIN: 0486287785
+title: World War II Allied Fighter Planes Trading Cards
+group: Book
+salesrank: 1270652
+similar: 0
+categories: 1
+|Books[283155]|Subjects[1000]|Home & Garden[48]|Crafts & Hobbies[5126]|General[5144]
+reviews: total: 1 downloaded: 1 avg rating: 5
+2003-7-10 cutomer: A3IDGASRQAW8B2 rating: 5 votes: 2 helpful: 2
+'''.split('\n')
+
+# Raw lines as they appear in amazon-meta.txt, before split_file() cleans them; titles exercise the quote/backslash/comma fixes (JR)
+raw_sample_records = '''Id:   1
+ASIN: 0827229534
+  title: Patterns of Preaching: A Sermon Sampler
+  group: Book
+  salesrank: 396585
+  similar: 5  0804215715  156101074X  0687023955  0687074231  082721619X
+  categories: 2
+   |Books[283155]|Subjects[1000]|Religion & Spirituality[22]|Christianity[12290]|Clergy[12360]|Preaching[12368]
+   |Books[283155]|Subjects[1000]|Religion & Spirituality[22]|Christianity[12290]|Clergy[12360]|Sermons[12370]
+  reviews: total: 2  downloaded: 2  avg rating: 5
+    2000-7-28  cutomer: A2JW67OY8U6HHK  rating: 5  votes:  10  helpful:   9
+    2003-12-14  cutomer: A2VE83MZF98ITY  rating: 5  votes:   6  helpful:   5
+
+Id:   2
+ASIN: 0738700797
+  title: "Candlemas",	"Feast of Flames" : A Witch's Guide \\ Vol. 1
+  group: Book
+  salesrank: 168596
+  similar: 5  0738700827  1567184960  1567182836  0738700525  0738700940
+  categories: 2
+   |Books[283155]|Subjects[1000]|Religion & Spirituality[22]|Earth-Based Religions[12472]|Wicca[12484]
+   |Books[283155]|Subjects[1000]|Religion & Spirituality[22]|Earth-Based Religions[12472]|Witchcraft[12486]
+  reviews: total: 12  downloaded: 12  avg rating: 4.5
+    2001-12-16  cutomer: A11NCO6YTE4BTJ  rating: 5  votes:   5  helpful:   4
+    2002-1-7  cutomer:  A9CQ3PLRNIR83  rating: 4  votes:   5  helpful:   5
+    2002-1-24  cutomer: A13SG9ACZ9O5IM  rating: 5  votes:   8  helpful:   8
+    2002-1-28  cutomer: A1BDAI6VEYMAZA  rating: 5  votes:   4  helpful:   4
+
+Id:   3
+ASIN: 0486287785
+  discontinued product
+'''.splitlines(keepends=True)
+
+
+class ParserBenchmark:
+    def __init__(self, n_repeats=20000):
+        self.lines = [x.strip() for x in sample_records] * n_repeats
+        self.tokenizer = LineTokenizer()
+
+    @staticmethod
+    def legacy_tokenize(line):
+        # Reproduces the per-line regex work previously done in Parser.load_split() (JR)
+        review_date = re.findall('^\d{4}-\d{1,2}-\d{1,2}', line)
+        if line.startswith('#') or line == '':
+            return None
+        elif line.startswith('discontinued product'):
+            return None
+        elif line.startswith('|'):
+            return len(re.findall('\|', line))
+        elif len(review_date) > 0:
+            return {x:y for x,y in re.findall('(\w+):\s+(\w+|\d+)', line.replace('cutomer', 'customer'))}
+        else:
+            property_key = re.findall('^(\w+)(?=:)', line)[0]
+            match property_key:
+                case 'Id':
+                    return re.findall('(?<=%(prop)s:)\s+(.+)$' % {'prop': property_key}, line)[0]
+                case 'categories':
+                    return re.findall('\d+', line.replace('  ', ' '))[0]
+                case 'reviews':
+                    return {x:y for x,y in re.findall('(?<=\s)(\w+\s*\w*):\s+(\d+)', line.replace('  ',' ')) if x != 'avg rating'}
+                case _:
+                    return property_key
+
+    def tokenize(self, line):
+        token_type, token = self.tokenizer.tokenize(line)
+        match token_type:
+            case LineTokenizer.CATEGORY:
+                return line.count('|')
+            case LineTokenizer.PROPERTY:
+                match token[0]:
+                    case 'categories':
+                        return self.tokenizer.parse_first_int(line)
+                    case 'reviews':
+                        return self.tokenizer.parse_review_meta(line)
+        return token
+
+    def time_fn(self, fn):
+        start = time.perf_counter()
+        for line in self.lines:
+            fn(line)
+        return time.perf_counter() - start
+
+    def run(self):
+        results = {
+            'before (re.findall)'   : self.time_fn(self.legacy_tokenize),
+            'after (LineTokenizer)' : self.time_fn(self.tokenize)
+        }
+
+        print('%(n)s lines per run' % {'n': len(self.lines)})
+        for label, duration in results.items():
+            print('%(lbl)-24s %(dur)8.3f s %(rate)14.0f lines/s' % {'lbl': label, 'dur': duration, 'rate': len(self.lines)/duration})
+
+        return results
+
+
+class SplitBenchmark:
+    '''
+    Times the per-line sanitizing done by Parser.split_file(): the seven-step replace chain called twice per line as before,
+    a single-pass translate() table plus regex, and the single LineTokenizer.clean() call now used.  All must produce the same output bytes.
+    The saving is one clean() per line, so the gain depends on what clean() costs next to tokenize() on the machine at hand (JR)
+    '''
+    # Single-character escapes in one pass, then space runs halved and a space before a colon dropped (JR)
+    clean_table = str.maketrans({'\\': '\\\\', "'": "\\'", '"': '\\"', '\t': None})
+    spacing_pattern = re.compile(r'  ?(?=:)| ( )')
+
+    def __init__(self, n_repeats=20000, n_runs=5):
+        self.lines = raw_sample_records * n_repeats
+        self.n_runs = n_runs
+        self.tokenizer = LineTokenizer()
+
+    @staticmethod
+    def legacy_clean_string(string):
+        return string.strip().replace('\\', '\\\\').replace("'", "\\'").replace(",\"", "\",").replace('"', '\\\"').replace('\t', '').replace('  ', ' ').replace(' :', ':')
+
+    def legacy_split(self):
+        item_data = list()
+        for line in self.lines:
+            current_line = self.legacy_clean_string(line)
+            self.tokenizer.tokenize(current_line)
+            item_data.append(self.legacy_clean_string(line))
+        return item_data
+
+    def single_pass_clean(self, line):
+        return self.spacing_pattern.sub(r'\1', line.strip().replace(',"', '",').translate(self.clean_table))
+
+    def single_pass_split(self):
+        item_data = list()
+        for line in self.lines:
+            current_line = self.single_pass_clean(line)
+            self.tokenizer.tokenize(current_line)
+            item_data.append(current_line)
+        return item_data
+
+    def split(self):
+        item_data = list()
+        for line in self.lines:
+            current_line = self.tokenizer.clean(line)
+            self.tokenizer.tokenize(current_line)
+            item_data.append(current_line)
+        return item_data
+
+    def time_fn(self, fn):
+        start = time.perf_counter()
+        output = fn()
+        return time.perf_counter() - start, output
+
+    def run(self):
+        # Best of n_runs with the garbage collector off, as timeit does.  The variants take turns within each run so that a change
+        # in machine load affects all of them; single runs vary by more than the difference being measured (JR)
+        results = dict()
+        outputs = dict()
+        gc.disable()
+        try:
+            for i in range(self.n_runs):
+                for label, fn in [('before (replace chain x2)', self.legacy_split), ('translate + regex x1', self.single_pass_split), ('after (clean x1)', self.split)]:
+                    duration, output = self.time_fn(fn)
+                    results[label] = min(duration, results.get(label, duration))
+                    outputs[label] = '\n'.join(output).encode('utf-8')
+        finally:
+            gc.enable()
+
+        print('%(n)s lines per run' % {'n': len(self.lines)})
+        for label, duration in results.items():
+            print('%(lbl)-26s %(dur)8.3f s %(rate)14.0f lines/s' % {'lbl': label, 'dur': duration, 'rate': len(self.lines)/duration})
+
+        expected = outputs['before (replace chain x2)']
+        for label, output in outputs.items():
+            if output != expected:
+                raise Exception('%(lbl)s output differs from the replace chain (%(a)s vs %(b)s bytes)' % {'lbl': label, 'a': len(expected), 'b': len(output)})
+        print('Output identical: %(n)s bytes' % {'n': len(expected)})
+        print('Speedup of clean x1 over the replace chain x2: %(x).2fx' % {'x': results['before (replace chain x2)'] / results['after (clean x1)']})
+
+        return results
+
+
+def main():
+    ParserBenchmark().run()
+    SplitBenchmark().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,14 +9,16 @@ STAGE_REPO="~/data_store/amazon_copurchasing"
 sudo podman cp "${STAGE_REPO}/." 'neo4j:/var/lib/neo4j/import/'
 
 # Import to database
+# With csv_compression=gzip in etc/config.ini, the data files are written as .csv.gz and should be referenced as such below
 sudo podman exec neo4j /var/lib/neo4j/bin/neo4j-admin database import full \
     --delimiter="\t" \
     --nodes import/csv_batches/n4db_product_node_header.csv,import/csv_batches/n4db_product_node_data.csv \
-    --nodes import/csv_batches/n4db_category_node_header.csv,import/csv_batches/n4db_category_node_data.csv \
+    --nodes import/csv_batches/n4db_category_tree_node_header.csv,import/csv_batches/n4db_category_tree_node_data.csv \
     --nodes import/csv_batches/n4db_review_node_header.csv,import/csv_batches/n4db_review_node_data.csv \
     --nodes import/csv_batches/n4db_customer_node_header.csv,import/csv_batches/n4db_customer_node_data.csv \
     --relationships import/csv_batches/n4db_product_edge_header.csv,import/csv_batches/n4db_product_edge_data.csv \
     --relationships import/csv_batches/n4db_category_edge_header.csv,import/csv_batches/n4db_category_edge_data.csv \
+    --relationships import/csv_batches/n4db_category_tree_edge_header.csv,import/csv_batches/n4db_category_tree_edge_data.csv \
     --relationships import/csv_batches/n4db_review_edge_header.csv,import/csv_batches/n4db_review_edge_data.csv \
     --relationships import/csv_batches/n4db_customer_edge_header.csv,import/csv_batches/n4db_customer_edge_data.csv \
     --id-type=string --skip-bad-relationships --skip-duplicate-nodes=true --overwrite-destination=true
@@ -25,11 +27,12 @@ sudo podman exec neo4j /var/lib/neo4j/bin/neo4j-admin database import full \
 # sudo podman exec neo4j /var/lib/neo4j/bin/neo4j-admin database import full \
 #     --delimiter="\t" \
 #     --nodes import/csv_batches/n4db_product_node_header.csv,'import/csv_batches/n4db_product_node_data_\d+\.csv' \
-#     --nodes import/csv_batches/n4db_category_node_header.csv,'import/csv_batches/n4db_category_node_data_\d+\.csv' \
+#     --nodes import/csv_batches/n4db_category_tree_node_header.csv,'import/csv_batches/n4db_category_tree_node_data_\d+\.csv' \
 #     --nodes import/csv_batches/n4db_review_node_header.csv,'import/csv_batches/n4db_review_node_data_\d+\.csv' \
 #     --nodes import/csv_batches/n4db_customer_node_header.csv,'import/csv_batches/n4db_customer_node_data_\d+\.csv' \
 #     --relationships import/csv_batches/n4db_product_edge_header.csv,'import/csv_batches/n4db_product_edge_data_\d+\.csv' \
 #     --relationships import/csv_batches/n4db_category_edge_header.csv,'import/csv_batches/n4db_category_edge_data_\d+\.csv' \
+#     --relationships import/csv_batches/n4db_category_tree_edge_header.csv,'import/csv_batches/n4db_category_tree_edge_data_\d+\.csv' \
 #     --relationships import/csv_batches/n4db_review_edge_header.csv,'import/csv_batches/n4db_review_edge_data_\d+\.csv' \
 #     --relationships import/csv_batches/n4db_customer_edge_header.csv,'import/csv_batches/n4db_customer_edge_data_\d+\.csv' \
 #     --id-type=string --skip-bad-relationships --skip-duplicate-nodes=true --overwrite-destination=true
@@ -4,12 +4,18 @@ import os
 import sys
 import re
 import json
+import mmap
+import contextlib
+import traceback
 # import logging
 import configparser as cfg
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 import hashlib as hl
-from datetime import datetime
-from multiprocessing import Pool, Process
+from datetime import datetime, date
+from multiprocessing import Process
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from joblib import Parallel, delayed, cpu_count
 from neo4j import GraphDatabase as gdb
 
@@ -21,25 +27,182 @@ sys.path.insert(0, os.path.join(project_root, 'lib'))
 
 from acpN4J import N4J
 from acpPerfMon import PerfMon
+from acpTokenizer import LineTokenizer
+from acpStats import RunningStat, BatchStat
+from acpStore import ColumnStore, SortedRuns, SpillingHashSet, entity_schemas
+from acpWriter import BulkWriter
+from acpReader import open_text, get_compression, compression_extensions
+from acpProgress import ProgressMonitor, get_reporter
 
 config = cfg.ConfigParser()
 config.read(config_path)
 
+
+class ReviewAccumulator:
+    # Per-product review statistics updated as each review line is parsed, so that the summary at record end is O(1) (JR)
+    __slots__ = ('ratings', 'ratings_wtd', 'votes', 'votes_total', 'helpful_ratios', 'first_day', 'last_day', 'customers')
+
+    def __init__(self):
+        self.ratings        = RunningStat()
+        self.ratings_wtd    = RunningStat()
+        self.votes          = RunningStat()
+        self.votes_total    = 0
+        self.helpful_ratios = RunningStat()
+        # Review dates as day ordinals; the mean time between sorted reviews only depends on the first and last (JR)
+        self.first_day      = None
+        self.last_day       = None
+        self.customers      = set()
+
+    def add(self, review_date, customer, rating, votes, helpful_ratio, rating_wtd):
+        # Avoiding datetime.strptime() per review; dates are in the form YYYY-M-D (JR)
+        day = date(*[int(x) for x in review_date.split('-')]).toordinal()
+        self.first_day = day if self.first_day is None else min(self.first_day, day)
+        self.last_day = day if self.last_day is None else max(self.last_day, day)
+
+        self.ratings.add(rating)
+        self.ratings_wtd.add(rating_wtd)
+        self.votes.add(votes)
+        self.votes_total += int(votes)
+        self.helpful_ratios.add(helpful_ratio)
+        self.customers.add(customer)
+
+    def summarise(self, precision):
+        ratings_avg     = self.ratings.get_mean()
+        hr_avg          = self.helpful_ratios.get_mean()
+        rating_avg_wtd  = 0 if hr_avg == 0.0 else (ratings_avg * hr_avg)/float(hr_avg)
+        n_intervals     = self.ratings.n - 1
+
+        return {
+            'review_rating_avg'         : round(ratings_avg, precision),
+            'review_rating_sd'          : round(self.ratings.get_std(), precision),
+            'review_votes_total'        : self.votes_total,
+            'review_votes_avg'          : round(self.votes.get_mean(), precision),
+            'review_votes_sd'           : round(self.votes.get_std(), precision),
+            # Equivalent to the mean of the day differences between consecutive sorted reviews (JR)
+            'review_mttr'               : 0 if n_intervals == 0 else round(np.float64(self.last_day - self.first_day) / n_intervals, precision),
+            'review_helpful_ratio_avg'  : round(hr_avg, precision),
+            'review_helpful_ratio_sd'   : round(self.helpful_ratios.get_std(), precision),
+            'review_rating_avg_wtd'     : round(rating_avg_wtd, precision),
+            'review_rating_wtd_avg'     : round(self.ratings_wtd.get_mean(), precision),
+            'review_rating_wtd_sd'      : round(self.ratings_wtd.get_std(), precision),
+            'customers_unique'          : len(self.customers)
+        }
+
+
+class Record:
+    # Fixed-field records for the parser's working set; __slots__ drops the per-instance __dict__ of the nested dictionaries (JR)
+    # Item access is kept so that record['field'] reads and writes as the dictionaries did (JR)
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for x in self.__slots__:
+            setattr(self, x, values.get(x))
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def update(self, values):
+        for x, y in values.items():
+            setattr(self, x, y)
+
+
+class ProductRecord(Record):
+    # Product node columns, less the Id which keys self.products; similar_to_ids is only set by similar_asin_to_id() (JR)
+    __slots__ = tuple(x.name for x in entity_schemas['product'] if x.name != 'Id') + ('similar_to_ids',)
+
+
+class CategoryRecord(Record):
+    # One per distinct path, shared by every product in that category; category_id is the id of the path's leaf segment (JR)
+    __slots__ = ('category_id', 'path', 'path_depth')
+
+
+class CategoryTreeRecord(Record):
+    # A segment of the category hierarchy and one of its parents; the same segment can sit under several parents (JR)
+    __slots__ = ('segment_id', 'parent_id', 'name', 'path', 'path_depth')
+
+
+class ReviewRecord(Record):
+    # Ratings and vote counts are held as ints rather than the matched strings (JR)
+    __slots__ = ('review_date', 'customer', 'rating', 'votes', 'helpful', 'helpful_ratio', 'review_rating_wtd')
+
+
 class Parser:
-    def __init__(self, batch_size=1000):
+    def __init__(self, batch_size=1000, datestamp=None):
         self.data_repo = os.path.join(project_root, 'data')
         self.batch_size = batch_size
         self.products = dict()
         self.categories = dict()
         self.category_map = dict()
+        # Interned name[id] segment -> integer node id, the (segment, parent) pairs already recorded, and those not yet written (JR)
+        self.category_segments = dict()
+        self.category_edges = set()
+        self.category_tree = list()
         self.reviews = dict()
-        self.customer_history = dict()
         self.customers = dict()
         self.summaries = {'product': dict(), 'category': dict(), 'review': dict(), 'customer': dict()}
-        self.datestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        # Pool workers are handed the run's datestamp so that all batches land in the same output directory (JR)
+        self.datestamp = datetime.now().strftime('%Y%m%d_%H%M%S') if datestamp is None else datestamp
         self.latest_export_timestamp = None
+        # Record of each batch written by dump_batch() as {'batch_id': ..., 'counts': {...}} (JR)
+        self.batch_log = list()
+        # Manifest of the segment being parsed by a pool worker, in which dump_batch() records each batch's files (JR)
+        self.manifest = None
         self.export_vars = ['product', 'category', 'review', 'customer']
         self.precision = 3
+        self.chunk_bytes = int(config.get('parser', 'chunk_size_mb')) * 1024 * 1024
+        # load_split() flushes once the records it holds reach about this many bytes; 0 flushes every batch_size products instead (JR)
+        self.batch_budget_bytes = int(config.get('parser', 'batch_memory_mb')) * 1024 * 1024
+        self.batch_bytes = 0
+        # Approximate bytes held per record, including its dictionary entry and id, measured with tracemalloc on CPython 3.11 (JR)
+        # Product titles and similar lists are added by length; categories are shared records, so only the entry is counted (JR)
+        self.record_bytes = {'product': 700, 'category': 120, 'review': 400}
+        self.parquet_compression = config.get('parser', 'parquet_compression')
+        self.write_buffer_bytes = int(config.get('parser', 'write_buffer_mb')) * 1024 * 1024
+        # neo4j-admin import reads .csv.gz data files directly (JR)
+        self.csv_compression = None if config.get('parser', 'csv_compression') == 'none' else config.get('parser', 'csv_compression')
+        # split_data batches may be written gzip or zstd-compressed; compressed inputs are always read transparently (JR)
+        self.split_compression = None if config.get('parser', 'split_compression') == 'none' else config.get('parser', 'split_compression')
+        # 'md5' keeps the 32 character hex ids; 'hash64' uses stable signed 64-bit hashes for reviews; categories always use integer tree ids (JR)
+        self.id_scheme = config.get('parser', 'id_scheme')
+        if self.id_scheme not in ['md5', 'hash64']:
+            raise Exception('Unknown id_scheme %(s)s.  Expected one of the following: md5, hash64' % {'s': self.id_scheme})
+        # Merge-stage datasets read back from the column store as pyarrow tables (JR)
+        self.tables = dict()
+        # Edge hashes (and category node ids) already written, per dataset, and the memory each may hold before spilling to disk (JR)
+        self.edge_sets = dict()
+        self.dedup_budget_bytes = int(config.get('parser', 'dedup_memory_mb')) * 1024 * 1024
+        self.export_perf = PerfMon('Parser.export')
+        # Per-dataset accumulators used while merge() streams batches (JR)
+        self.summary_state = dict()
+        # Columns each merge-stage dataset needs for its summary and CSV export (JR)
+        self.merge_columns = {
+            'product'   : [x.name for x in entity_schemas['product'] if x.name != 'Id'],
+            # Category nodes are written from category_tree; the product-category rows give the summary and CATEGORIZED_AS edges (JR)
+            'category'  : ['ASIN', 'Id', 'path_depth'],
+            'category_tree' : ['Id', 'parent_id', 'name', 'path', 'path_depth'],
+            'review'    : ['product_id', 'ASIN', 'Id', 'review_date', 'customer', 'rating', 'votes', 'helpful', 'helpful_ratio', 'review_rating_wtd'],
+            'customer'  : ['Id', 'customer', 'review_date', 'helpful', 'rating', 'votes', 'helpful_ratio']
+        }
+        # Columns needed when only the edges of a dataset are exported (JR)
+        self.edge_columns = {
+            'product'   : ['ASIN', 'similar_to'],
+            'category'  : ['ASIN', 'Id'],
+            'category_tree' : ['Id', 'parent_id'],
+            'review'    : ['ASIN', 'Id'],
+            'customer'  : ['customer', 'Id']
+        }
+        self.tokenizer = LineTokenizer()
+        # Set in pool workers to a ProgressReporter; load_split() reports every progress_lines lines and merge() every batch (JR)
+        self.progress = None
+        self.progress_lines = 10000
+        self.progress_interval = float(config.get('parser', 'progress_interval_s'))
+        self.progress_stall = float(config.get('parser', 'progress_stall_s'))
+        self.progress_position = 0
+        self.progress_records = 0
+        self.read_position = None
 
         # logger = logging.getlogger('parser')
         # logger.setLevel(logging.INFO)
@@ -53,32 +216,55 @@ class Parser:
 
     def clear_datasets(self, dataset=None):
         if dataset is None:
+            self.tables = dict()
             self.products = dict()
             self.categories = dict()
             self.category_map = dict()
+            self.category_segments = dict()
+            self.category_edges = set()
+            self.category_tree = list()
             self.reviews = dict()
-            self.customer_history = dict()
             self.customers = dict()
         
         else:
+            self.tables.pop(dataset, None)
             match dataset:
                 case 'product':
                     self.products = dict()
                 case 'category':
                     self.categories = dict()
                     self.category_map = dict()
+                    self.category_segments = dict()
+                    self.category_edges = set()
+                    self.category_tree = list()
                 case 'review':
                     self.reviews = dict()
                 case 'customer':
                     self.customers = dict()
-                    self.customer_history = dict()
 
     def clean_string(self, string):
         # Escape single quotes which break Python string interpolation (JR)
         # Escape backslashes which break Cypher queries (JR)
         # Correct misordered quotes & commas (JR)
         # Correct excess spacing around colons (JR)
-        return string.strip().replace('\\', '\\\\').replace("'", "\\'").replace(",\"", "\",").replace('"', '\\\"').replace('\t', '').replace('  ', ' ').replace(' :', ':')
+        # Shared with the tokenizer so split_file() and the record index clean each line once (JR)
+        return self.tokenizer.clean(string)
+
+    def open_writer(self, path, mode='w', compress=False):
+        # Large-block writer shared by all exports; compress applies the configured csv_compression (JR)
+        return BulkWriter(path, mode, self.write_buffer_bytes, self.csv_compression if compress else None)
+
+    def find_source_file(self, name='amazon-meta.txt'):
+        # The SNAP dump may be kept compressed as <name>.zst or <name>.gz; an uncompressed copy is preferred as it can be memory-mapped (JR)
+        for ext in [''] + list(compression_extensions.values()):
+            path = os.path.join(self.data_repo, name + ext)
+            if os.path.isfile(path):
+                return path
+
+        raise Exception('Source file %(name)s not found in %(path)s' % {'name': name, 'path': self.data_repo})
+
+    def get_split_path(self, batch_idx):
+        return os.path.join(self.data_repo, 'split_data', ''.join([str(batch_idx).zfill(6), '.txt', compression_extensions.get(self.split_compression, '')]))
 
     def split_file(self, filename):
         current_id = None
@@ -88,31 +274,26 @@ class Parser:
         batch_idx = 0
         item_data = list()
 
-        node_fields = {
-            'product':          ['ASIN', 'title', 'group', 'salesrank', 'similar_to', 'category_path_ct', 'category_path_depth_avg', 'category_path_depth_sd', 'review_ct', 'review_downloaded_ct', 'review_rating_avg', 'review_rating_sd', 'review_votes_total', 'review_votes_avg', 'review_votes_sd', 'review_mttr', 'review_helpful_ratio_avg', 'review_helpful_ratio_sd', 'review_rating_avg_wtd', 'review_rating_wtd_avg', 'review_rating_wtd_sd'],
-            'review':           ['Id', 'customer', 'helpful', 'rating', 'review_date', 'votes', 'review_helpful_ratio', 'review_rating_wtd'],
-            'category':         ['Id', 'category_path', 'path_depth'],
-            'customer':         ['Id', 'review_ct', 'review_mttr', 'helpful_avg', 'helpful_sd', 'rating_avg', 'rating_sd', 'rating_avg_wtd', 'votes_total', 'votes_avg', 'votes_sd', 'helpful_ratio_avg', 'helpful_ratio_sd'],
-            'summary_product':  ['path_depth_avg', 'path_depth_sd'],
-            'summary_review':   ['product_ct'],
-            'summary_category': ['path_depth_avg', 'path_depth_sd'],
-            'summary_customer': ['customer_unique_ct']
-        }
+        # Batches left by an earlier split would otherwise be parsed along with the new ones (JR)
+        split_path = os.path.join(self.data_repo, 'split_data')
+        os.makedirs(split_path, exist_ok=True)
+        for f in [x for x in os.listdir(split_path) if re.match('^\d{6}\.txt', x)]:
+            os.remove(os.path.join(split_path, f))
 
-        with open(filename, 'r', 1, "utf-8") as dataset:
+        # Compressed sources are decompressed as they are streamed (JR)
+        with open_text(filename) as dataset:
             for line in dataset:
 
                 current_line = self.clean_string(line)
-                review_date = re.findall('^\d{4}-\d{1,2}-\d{1,2}', current_line)
+                token_type, token = self.tokenizer.tokenize(current_line)
 
-                if current_line.startswith('#') or current_line.startswith("discontinued product"):
+                if token_type == LineTokenizer.DISCONTINUED or current_line.startswith('#'):
                     continue
                 elif current_line == '' and current_id in self.products.keys():
                     batch_items += 1
                     if batch_items >= self.batch_size:
-                        with open(os.path.join(self.data_repo, 'split_data', ''.join([str(batch_idx).zfill(6), '.txt'])), 'w', 1, 'utf-8') as f:
-                            for row in item_data:
-                                f.write(row + '\n')
+                        with BulkWriter(self.get_split_path(batch_idx), 'w', self.write_buffer_bytes, self.split_compression) as f:
+                            f.writelines(row + '\n' for row in item_data)
                             f.write('\n')
                             batch_idx += 1
                         item_data = list()
@@ -122,212 +303,394 @@ class Parser:
 
                 else:
                     # Collect the major property key from the current line (JR)
-                    property_key = re.findall('^(\w+)(?=:)', current_line)
                     # Jedi 0.15.12 seems to not understand the match-case syntax, but Python 3.10+ executes as expected (JR)
-                    match property_key:
-                        case ['Id']:
-                            current_id = re.findall('(?<=%(prop)s:)\s+(.+)$' % {'prop': property_key}, current_line)[0]
-                            # Initialize all fields as empty strings by default (JR)
-                            self.products[current_id] = {x:'' for x in node_fields['product']}
+                    match token_type, token:
+                        case (LineTokenizer.PROPERTY, ('Id', property_value)):
+                            current_id = property_value
+                            self.products[current_id] = ProductRecord()
                     if current_id is not None:
-                        item_data.append(self.clean_string(line))
+                        # Reusing the line cleaned above rather than cleaning it a second time (JR)
+                        item_data.append(current_line)
 
             # Record any lingering data (JR)
             if batch_items > 0:
-                with open(os.path.join(self.data_repo, 'split_data', ''.join([str(batch_idx).zfill(6), '.txt'])), 'w', 1, 'utf-8') as f:
-                    for row in item_data:
-                        f.write(row + '\n')
+                with BulkWriter(self.get_split_path(batch_idx), 'w', self.write_buffer_bytes, self.split_compression) as f:
+                    f.writelines(row + '\n' for row in item_data)
                     f.write('\n')
 
 
+    def find_chunk_offsets(self, filename, chunk_bytes=None):
+        '''
+        Memory-maps the source file and returns a list of (start, end) byte ranges, each beginning on an 'Id:' line.
+        Ranges are roughly chunk_bytes in size so they can be handed directly to load_split() without staging split_data copies (JR)
+        '''
+        if chunk_bytes is None:
+            chunk_bytes = self.chunk_bytes
+
+        offsets = list()
+
+        with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            file_size = len(mm)
+            # Skip the file header; the first record starts at the first 'Id:' line (JR)
+            if mm[:3] == b'Id:':
+                start = 0
+            else:
+                start = mm.find(b'\nId:') + 1
+                # No records present (JR)
+                if start == 0:
+                    return offsets
+
+            while start < file_size:
+                # Jump ahead by the chunk size, then walk forward to the next record boundary (JR)
+                boundary = mm.find(b'\nId:', min(start + chunk_bytes, file_size) - 1)
+                end = file_size if boundary == -1 else boundary + 1
+                offsets.append((start, end))
+                start = end
+
+        return offsets
+
+    def get_record_index_path(self, filename):
+        return ''.join([filename, '.idx.npy'])
+
+    def build_record_index(self, filename):
+        '''
+        Scans the source file once and writes a sidecar index of every record's Id, ASIN, group, byte offset and byte length.
+        The index is stored next to the source file as <filename>.idx.npy and reused by get_record_index() (JR)
+        '''
+        if get_compression(filename) is not None:
+            raise Exception('A record index needs an uncompressed source file; %(f)s is compressed' % {'f': filename})
+
+        record_pattern = re.compile(rb'^Id:\s+(\d+)\s*?\nASIN:\s+(\S+)\s*?\n(?:\s+title:[^\n]*\n\s+group:[ \t]*([^\r\n]*))?', re.M)
+        ids, asins, groups, offsets = list(), list(), list(), list()
+
+        with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            file_size = len(mm)
+            for m in record_pattern.finditer(mm):
+                ids.append(int(m.group(1)))
+                asins.append(m.group(2).decode('utf-8'))
+                # Discontinued products have no title/group lines (JR)
+                groups.append('' if m.group(3) is None else m.group(3).decode('utf-8').strip())
+                offsets.append(m.start())
+
+        # Each record runs until the start of the next one; the last runs to the end of the file (JR)
+        lengths = np.diff(np.append(offsets, file_size)) if len(offsets) > 0 else list()
+
+        record_index = np.zeros(len(ids), dtype=[
+            ('id', 'i8'),
+            ('asin', 'U%(n)s' % {'n': max([len(x) for x in asins], default=1)}),
+            ('group', 'U%(n)s' % {'n': max([len(x) for x in groups], default=1)}),
+            ('offset', 'i8'),
+            ('length', 'i8')
+        ])
+        record_index['id'] = ids
+        record_index['asin'] = asins
+        record_index['group'] = groups
+        record_index['offset'] = offsets
+        record_index['length'] = lengths
+
+        np.save(self.get_record_index_path(filename), record_index)
+
+        return record_index
+
+    def get_record_index(self, filename):
+        # Reuse the sidecar index unless the source file has been modified since it was built (JR)
+        index_path = self.get_record_index_path(filename)
+        if os.path.isfile(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(filename):
+            return np.load(index_path)
+
+        return self.build_record_index(filename)
+
+    def find_record_ranges(self, filename, ids=None, asins=None, groups=None):
+        # Returns the byte ranges of all records matching any of the given Ids, ASINs or groups, coalescing adjacent records (JR)
+        record_index = self.get_record_index(filename)
+        selected = np.zeros(len(record_index), dtype=bool)
+
+        if ids is not None:
+            selected |= np.isin(record_index['id'], [int(x) for x in ids])
+        if asins is not None:
+            selected |= np.isin(record_index['asin'], list(asins))
+        if groups is not None:
+            selected |= np.isin(record_index['group'], list(groups))
+
+        byte_ranges = list()
+        for record in np.sort(record_index[selected], order='offset'):
+            start, end = int(record['offset']), int(record['offset'] + record['length'])
+            if len(byte_ranges) > 0 and byte_ranges[-1][1] == start:
+                byte_ranges[-1] = (byte_ranges[-1][0], end)
+            else:
+                byte_ranges.append((start, end))
+
+        return byte_ranges
+
+    def load_records(self, filename, ids=None, asins=None, groups=None, segment_idx=None):
+        # Re-parse only the selected products from the raw source file, using the sidecar record index to seek to them (JR)
+        byte_ranges = self.find_record_ranges(filename, ids, asins, groups)
+        if len(byte_ranges) > 0:
+            self.load_split(filename, byte_range=byte_ranges, segment_idx=segment_idx)
+
+        return
+
+    def read_lines(self, filename, byte_range=None):
+        # Yields stripped lines either from a whole (split) file or from byte ranges of the raw source file (JR)
+        if byte_range is None:
+            # Split files may be gzip or zstd-compressed; progress follows the bytes read from disk (JR)
+            with open(filename, 'rb') as raw, open_text(filename, fileobj=raw) as dataset:
+                self.read_position = raw.tell
+                for line in dataset:
+                    yield line.strip()
+        elif get_compression(filename) is not None:
+            raise Exception('Byte ranges can only be read from an uncompressed source file; %(f)s is compressed' % {'f': filename})
+        else:
+            # Accepts a single (start, end) tuple or a list of them (JR)
+            byte_ranges = [byte_range] if isinstance(byte_range, tuple) else byte_range
+            read_before = 0
+            with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for start, end in byte_ranges:
+                    mm.seek(start)
+                    # Bytes consumed so far across all of the ranges (JR)
+                    self.read_position = lambda: read_before + mm.tell() - start
+                    while mm.tell() < end:
+                        # Apply the same sanitization split_file() would have so both paths produce identical records (JR)
+                        current_line = self.clean_string(mm.readline().decode('utf-8'))
+                        if current_line.startswith('discontinued product'):
+                            continue
+                        yield current_line
+                    read_before += end - start
+
+    def report_progress(self, final=False):
+        # Hands the bytes read and products parsed since the last report to the worker's progress file (JR)
+        position = self.progress_position if final else self.read_position()
+        records = self.parser_perf.counter['parse record']
+        self.progress.update(position - self.progress_position, records - self.progress_records)
+        self.progress_position = position
+        self.progress_records = records
+
+    def get_record_id(self, text):
+        # Stable across runs and worker processes, unlike hash() (JR)
+        if self.id_scheme == 'hash64':
+            return int.from_bytes(hl.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+        return hl.md5(text.encode('utf-8')).hexdigest()
+
+    def get_segment_id(self, segment):
+        # Segments carry Amazon's numeric category id; any without one fall back to a stable 64-bit hash (JR)
+        name, segment_id = self.tokenizer.parse_category_segment(segment)
+        if segment_id is None:
+            segment_id = int.from_bytes(hl.blake2b(segment.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+        return name, segment_id
+
+    def add_category_path(self, path):
+        '''
+        Interns each name[id] segment of a new |-delimited path and records any (segment, parent) pairs not seen before,
+        so that the hierarchy can be exported as SUBCATEGORY_OF edges between integer node ids (JR)
+        '''
+        # Paths start with '|', so the depth of each segment is its index in the split (JR)
+        segments = path.split('|')
+        parent_id = None
+        for depth in range(1, len(segments)):
+            segment = segments[depth]
+            if segment not in self.category_segments:
+                self.category_segments[sys.intern(segment)] = self.get_segment_id(segment)[1]
+            segment_id = self.category_segments[segment]
+            # A segment repeated in place (e.g. 'Amazon.com Stores[285080]|Amazon.com Stores[285080]') would be its own parent (JR)
+            if segment_id == parent_id:
+                continue
+
+            if (segment_id, parent_id) not in self.category_edges:
+                self.category_edges.add((segment_id, parent_id))
+                self.category_tree.append(CategoryTreeRecord(
+                    segment_id=segment_id, parent_id=parent_id, name=self.tokenizer.parse_category_segment(segment)[0],
+                    path='|'.join(segments[:depth + 1]), path_depth=depth
+                ))
+            parent_id = segment_id
+
+        # Path strings are interned so that products in the same category share a single copy (JR)
+        category = CategoryRecord(category_id=parent_id, path=sys.intern(path), path_depth=len(segments) - 1)
+        self.category_map[category.path] = category
+
+        return category
+
+    def is_batch_full(self):
+        if self.batch_budget_bytes > 0:
+            return self.batch_bytes >= self.batch_budget_bytes
+        return len(self.products) >= self.batch_size or len(self.categories) >= self.batch_size or len(self.reviews) >= self.batch_size
+
+    def get_batch_id(self, batch_idx, sub_batch_idx=None):
+        # Segments may be flushed more than once, so a sub-batch index keeps their outputs from overwriting each other (JR)
+        if sub_batch_idx is None:
+            return str(batch_idx).zfill(6)
+        return '_'.join([str(batch_idx).zfill(6), str(sub_batch_idx).zfill(4)])
+
     # Alternate version of load() for execution in parallel (JR)
-    def load_split(self, filename):
+    # byte_range/segment_idx allow for parsing (start, end) sections of the raw source file as found by find_chunk_offsets() or find_record_ranges() (JR)
+    # Pool workers pass log_results=False and leave the export history and performance logs to the reduce step in ParseAsync (JR)
+    def load_split(self, filename, byte_range=None, segment_idx=None, log_results=True):
         self.parser_perf = PerfMon('Parser.load_split')
         self.parser_perf.add_timelog_event('init')
-
-        node_fields = {
-            'product':          ['ASIN', 'title', 'group', 'salesrank', 'similar_to', 'similar_to_ct', 'category_path_ct', 'category_path_depth_avg', 'category_path_depth_sd', 'review_total_ct', 'review_downloaded_ct', 'review_rating_avg', 'review_rating_sd', 'review_votes_total', 'review_votes_avg', 'review_votes_sd', 'review_mttr', 'review_helpful_ratio_avg', 'review_helpful_ratio_sd', 'review_rating_avg_wtd', 'review_rating_wtd_avg', 'review_rating_wtd_sd', 'customers_unique'],
-            'review':           ['Id', 'customer', 'helpful', 'rating', 'review_date', 'votes', 'review_helpful_ratio', 'review_rating_wtd'],
-            'category':         ['path', 'path_depth'],
-            'customer':         ['Id', 'review_ct', 'helpful_avg', 'helpful_sd', 'rating_avg', 'rating_sd', 'rating_avg_wtd', 'votes_total', 'votes_avg', 'votes_sd', 'helpful_ratio_avg', 'helpful_ratio_sd'],
-            'summary_product':  ['path_depth_avg', 'path_depth_sd'],
-            'summary_review':   ['product_ct'],
-            'summary_category': ['path_depth_avg', 'path_depth_sd'],
-            'summary_customer': ['customer_unique_ct']
-        }
+        self.progress_position = 0
+        self.progress_records = 0
 
         current_id = None
+        current_review_stats = None
         batch_idx = 0
+        sub_batch_idx = 0
         file_segment = False
 
         input_file_idx = re.findall('\d{6}(?=\.txt)', filename)
 
-        if len(input_file_idx) != 0:
+        if segment_idx is not None:
+            file_segment = True
+            batch_idx = int(segment_idx)
+        elif len(input_file_idx) != 0:
             file_segment = True
             batch_idx = int(input_file_idx[0])
 
-        with open(filename, 'r', 1, "utf-8") as dataset:
+        with contextlib.closing(self.read_lines(filename, byte_range)) as dataset:
             for line in dataset:
 
                 # Reducing function call counts since this was a common operation (JR)
                 current_line = line.strip()
-                review_date = re.findall('^\d{4}-\d{1,2}-\d{1,2}', current_line)
+                # Single dispatch on the line prefix using precompiled patterns (JR)
+                token_type, token = self.tokenizer.tokenize(current_line)
 
-                #this is a comment or empty line
-                if current_line.startswith('#') or (current_line == '' and current_id is None):
+                #this is a comment, an unused property, or empty line
+                if token_type == LineTokenizer.SKIP or (token_type == LineTokenizer.BLANK and current_id is None):
                     continue
 
                 # This will not get hit when using the split dataset as these lines are excluded (JR)
                 # Retaining in case of execution where these lines remain (JR)
-                elif current_line.startswith("discontinued product"):
-                    self.products[current_id] = {x:None for x in node_fields['product']}
+                elif token_type == LineTokenizer.DISCONTINUED:
+                    self.products[current_id] = ProductRecord()
 
-                elif current_line.startswith('|'):
-                    current_category_id = hl.md5(current_line.encode('utf-8')).hexdigest()
+                elif token_type == LineTokenizer.CATEGORY:
                     if current_id not in self.categories.keys():
                         self.categories[current_id] = dict()
 
-                    # Build map of unique paths, expanding only when a new path is detected (JR)
-                    if current_line not in self.category_map.keys():
-                        self.category_map[current_line] = current_category_id
+                    # Build map of unique paths, splitting a path into the category tree only when it is first seen (JR)
+                    category = self.category_map.get(current_line)
+                    if category is None:
+                        category = self.add_category_path(current_line)
 
-                    if current_category_id not in self.categories[current_id].keys():
-                        self.categories[current_id][self.category_map[current_line]] = dict()
-                    
-                    # This could probably be restructured as a flat list, but maintaining nested dictionary pattern for consistency (JR)
-                    self.categories[current_id][self.category_map[current_line]]['path'] = current_line
-                    self.categories[current_id][self.category_map[current_line]]['path_depth'] = len(re.findall('\|', current_line))
-                    
+                    self.categories[current_id][category.path] = category
+                    self.batch_bytes += self.record_bytes['category']
 
-                elif len(review_date) > 0:
-                    current_review_id = hl.md5(' '.join([current_id, current_line]).encode('utf-8')).hexdigest()
+
+                elif token_type == LineTokenizer.REVIEW:
+                    review_date, current_review = token
+                    current_review_id = self.get_record_id(' '.join([current_id, current_line]))
                     if current_id not in self.reviews.keys():
                         self.reviews[current_id] = dict()
                     
-                    if current_review_id not in self.reviews[current_id].keys():
-                        self.reviews[current_id][current_review_id] = {x:'' for x in node_fields['review']}
-
-                    # Unwind dictionaries and join them together (JR)
-                    # 'customer' is misspelled as 'cutomer' (missing 's') in the data (JR)
-                    current_review = {x:y for x,y in re.findall('(\w+):\s+(\w+|\d+)', current_line.replace('cutomer', 'customer'))}
-                    helpful_ratio = 0 if current_review['votes'] == '0' else round(float(current_review['helpful'])/float(current_review['votes']), self.precision)
-                    self.reviews[current_id][current_review_id] = {
-                        **{'review_date':review_date[0]},
-                        **current_review,
-                        **{
-                            'review_helpful_ratio': helpful_ratio,
-                            'review_rating_wtd': 0 if helpful_ratio == 0 else round((float(current_review['rating']) * float(helpful_ratio))/float(helpful_ratio), self.precision)
-                        }
-                    }
-
-                    if current_review['customer'] not in self.customer_history.keys():
-                        self.customer_history[current_review['customer']] = dict()
-
-                    if current_review_id not in self.customer_history[current_review['customer']].keys():
-                        self.customer_history[current_review['customer']][current_review_id] = dict()
-
-                    self.customer_history[current_review['customer']][current_review_id] = {
-                        # Should the current ASIN/product id be included here?  Would be more direct, but is ultimately redundant since the review id is embedded. (JR)
-                        **{'review_date':review_date[0]},
-                        **{x:y for x,y in current_review.items() if x != 'customer'},
-                        **{'helpful_ratio': helpful_ratio}
-                    }
-
-                elif current_id is not None and current_line == '':
-                    if len(self.products) >= self.batch_size or len(self.categories) >= self.batch_size or len(self.reviews) >= self.batch_size:
-                        # Writing as json to easily retain field names; CSV may be more performant, but would require additional steps to map field titles during collation (JR).
-                        # self.dump_neo4j_db_csvs(batch_id=str(batch_idx).zfill(6))
-                        self.dump_json(batch_id=str(batch_idx).zfill(6))
-                        if not file_segment:
-                            batch_idx += 1
-
+                    # Repeated review lines share an id and are only counted once, as before (JR)
+                    is_new_review = current_review_id not in self.reviews[current_id].keys()
+
+                    rating = int(current_review['rating'])
+                    votes = int(current_review['votes'])
+                    helpful = int(current_review['helpful'])
+                    helpful_ratio = 0 if votes == 0 else round(float(helpful)/float(votes), self.precision)
+                    review_rating_wtd = 0 if helpful_ratio == 0 else round((float(rating) * float(helpful_ratio))/float(helpful_ratio), self.precision)
+                    # Customer ids are interned as each recurs across many reviews (JR)
+                    customer = sys.intern(current_review['customer'])
+                    self.reviews[current_id][current_review_id] = ReviewRecord(
+                        review_date=review_date, customer=customer, rating=rating, votes=votes, helpful=helpful,
+                        helpful_ratio=helpful_ratio, review_rating_wtd=review_rating_wtd
+                    )
+
+                    # Update the streaming summary statistics for the current product (JR)
+                    if is_new_review:
+                        self.batch_bytes += self.record_bytes['review']
+                        current_review_stats.add(review_date, customer, rating, votes, helpful_ratio, review_rating_wtd)
+
+                    # Customer histories are no longer duplicated here; they are a projection of the review columns written by dump_batch() (JR)
+
+                elif token_type == LineTokenizer.BLANK:
                     # Perform summary calculations for the current ID now that all data is collected (JR)
                     # Embedding summary statistics into product node only if reviews have been documented for the current product (JR)
                     if current_id in self.reviews.keys():
-                        # Collect and preprocess values (JR)
-                        ratings_values          = [float(y['rating']) for x,y in self.reviews[current_id].items()]
-                        ratings_wtd_values      = [float(y['review_rating_wtd']) for x,y in self.reviews[current_id].items()]
-                        votes_values            = [int(y['votes']) for x,y in self.reviews[current_id].items()]
-                        review_dates            = [datetime.strptime(y['review_date'], '%Y-%m-%d') for x,y in self.reviews[current_id].items()]
-                        days_between_reviews    = [x.days for x in np.ediff1d([d for d in sorted(review_dates)])]
-                        hr_values               = [float(y['review_helpful_ratio']) for x,y in self.reviews[current_id].items()]
-                        hr_avg                  = np.mean(hr_values)
-                        customer_ids            = set(y['customer'] for x,y in self.reviews[current_id].items())
-                        rating_avg_wtd          = 0 if hr_avg == 0.0 else (np.mean(ratings_values) * hr_avg)/float(hr_avg)
-
-                        # Apply aggregate calculations (JR)
-                        self.products[current_id] = {
-                            **self.products[current_id],
-                            **{
-                                'review_rating_avg'         : round(np.mean(ratings_values), self.precision),
-                                'review_rating_sd'          : round(np.std(ratings_values), self.precision),
-                                'review_votes_total'        : int(np.sum(votes_values)),
-                                'review_votes_avg'          : round(np.mean(votes_values), self.precision),
-                                'review_votes_sd'           : round(np.std(votes_values), self.precision),
-                                'review_mttr'               : 0 if len(days_between_reviews) == 0 else round(np.mean(days_between_reviews), self.precision),
-                                'review_helpful_ratio_avg'  : round(hr_avg, self.precision),
-                                'review_helpful_ratio_sd'   : round(np.std(hr_values), self.precision),
-                                'review_rating_avg_wtd'     : round(rating_avg_wtd, self.precision),
-                                'review_rating_wtd_avg'     : round(np.mean(ratings_wtd_values), self.precision),
-                                'review_rating_wtd_sd'      : round(np.std(ratings_wtd_values), self.precision),
-                                'customers_unique'          : len(customer_ids)
-                            }
-                        }
+                        # Apply aggregate calculations accumulated while the review lines were parsed (JR)
+                        self.products[current_id].update(current_review_stats.summarise(self.precision))
 
                     if current_id in self.categories.keys():
                         # Collect and preprocess values (JR)
-                        path_depths = [float(self.categories[current_id][c]['path_depth']) for c in self.categories[current_id]]
+                        path_depths = [float(x.path_depth) for x in self.categories[current_id].values()]
                         # Apply aggregate calculations (JR)
-                        self.products[current_id]['category_path_ct']           = len(path_depths)
-                        self.products[current_id]['category_path_depth_avg']    = round(np.mean(path_depths), self.precision)
-                        self.products[current_id]['category_path_depth_sd']     = round(np.std(path_depths), self.precision)
+                        self.products[current_id].category_path_ct          = len(path_depths)
+                        self.products[current_id].category_path_depth_avg   = round(np.mean(path_depths), self.precision)
+                        self.products[current_id].category_path_depth_sd    = round(np.std(path_depths), self.precision)
+
+                    # Flushing only after the summary calculations so the last product of a batch retains its statistics (JR)
+                    # A product is never split across batches, however many reviews it has (JR)
+                    if self.is_batch_full():
+                        self.parser_perf.add_timelog_event('flush batch')
+                        self.parser_perf.increment_counter('flush bytes', self.batch_bytes)
+                        # Writing typed columns per entity so later stages can read back only the fields they need (JR)
+                        # self.dump_neo4j_db_csvs(batch_id=str(batch_idx).zfill(6))
+                        self.dump_batch(batch_id=self.get_batch_id(batch_idx, sub_batch_idx if file_segment else None))
+                        if file_segment:
+                            sub_batch_idx += 1
+                        else:
+                            batch_idx += 1
 
                 # By the ordering of the data in amazon-meta.txt this will be hit first,
                 # allowing property_key to be available in the prior conditions (JR)
                 else:
-                    # Collect the major property key from the current line (JR)
-                    property_key = re.findall('^(\w+)(?=:)', current_line)[0]
+                    # The major property key and its value are split out by the tokenizer (JR)
+                    property_key, property_value = token
                     # Jedi 0.15.12 seems to not understand the match-case syntax, but Python 3.10+ executes as expected (JR)
                     match property_key:
                         case 'Id':
-                            current_id = re.findall('(?<=%(prop)s:)\s+(.+)$' % {'prop': property_key}, current_line)[0]
-                            # Initialize all fields as empty strings by default (JR)
-                            self.products[current_id] = {x:'' for x in node_fields['product']}
-                        case ('ASIN' | 'title' | 'group'):
-                            self.products[current_id][property_key] = current_line.split(': ')[1]
+                            current_id = property_value
+                            current_review_stats = ReviewAccumulator()
+                            self.parser_perf.increment_counter('parse record')
+                            # Fields start as None, which the column store writes as missing just as it did empty strings (JR)
+                            self.products[current_id] = ProductRecord()
+                            self.batch_bytes += self.record_bytes['product']
+                        case 'ASIN':
+                            self.products[current_id].ASIN = current_line.split(': ')[1]
+                        case 'title':
+                            self.products[current_id].title = current_line.split(': ')[1]
+                            self.batch_bytes += len(self.products[current_id].title)
+                        case 'group':
+                            # Few distinct groups, so one shared string each (JR)
+                            self.products[current_id].group = sys.intern(current_line.split(': ')[1])
                         case 'salesrank':
-                            self.products[current_id][property_key] = int(current_line.split(': ')[1])
+                            self.products[current_id].salesrank = int(current_line.split(': ')[1])
                         case 'similar':
                             current_similar = current_line.split()[2:]
-                            self.products[current_id]['similar_to'] = ';'.join(current_similar)
-                            self.products[current_id]['similar_to_ct'] = len(current_similar)
+                            self.products[current_id].similar_to = ';'.join(current_similar)
+                            self.products[current_id].similar_to_ct = len(current_similar)
+                            self.batch_bytes += len(self.products[current_id].similar_to)
                         case 'categories':
                             # Collected in the default section below
-                            self.products[current_id]['category_path_ct'] = re.findall('\d+', current_line.replace('  ', ' '))[0]
+                            self.products[current_id].category_path_ct = int(self.tokenizer.parse_first_int(current_line))
                         case 'reviews':
                             # Only pulling the total and download count here. (JR)
                             # Average rating will be calculated with other summary statistics by aggregation of values across each review entry (JR)
-                            review_meta = {x:y for x,y in re.findall('(?<=\s)(\w+\s*\w*):\s+(\d+)', current_line.replace('  ',' ')) if x != 'avg rating'}
-                            self.products[current_id] = {
-                                **self.products[current_id],
-                                **{"review_%(z)s_ct" % {'z': x}:int(y) for x,y in review_meta.items()}
-                            }
+                            review_meta = self.tokenizer.parse_review_meta(current_line)
+                            self.products[current_id].update({"review_%(z)s_ct" % {'z': x}:y for x,y in review_meta.items()})
                         case _:
                             # Ignore the line by default - if it's important, it needs to be allocated above (JR)
                             continue
 
-                # Update performance counters (JR)
-                self.parser_perf.add_timelog_event('parse line')
+                # Update performance counters; the time log is kept per flushed batch so it does not grow with every line (JR)
                 self.parser_perf.increment_counter('parse line')
+                if self.progress is not None and self.parser_perf.counter['parse line'] % self.progress_lines == 0:
+                    self.report_progress()
 
             # Write any remaining data to disk (JR)
             if len(self.products) > 0 or len(self.categories) > 0 or len(self.reviews) > 0:
-                # Writing as json to easily retain field names; CSV may be more performant, but would require additional steps to map field titles during collation (JR).
+                self.parser_perf.add_timelog_event('flush batch')
+                self.parser_perf.increment_counter('flush bytes', self.batch_bytes)
+                # Writing typed columns per entity so later stages can read back only the fields they need (JR)
                 # self.dump_neo4j_db_csvs(batch_id=str(batch_idx).zfill(6))
-                self.dump_json(batch_id=str(batch_idx).zfill(6))
+                self.dump_batch(batch_id=self.get_batch_id(batch_idx, sub_batch_idx if file_segment else None))
 
             self.parser_perf.add_timelog_event('end')
-            self.parser_perf.log_all()
+            if self.progress is not None:
+                self.report_progress(final=True)
+
+            if log_results:
+                self.log_export_timestamp()
+                self.parser_perf.log_all()
 
         return
 
@@ -335,8 +698,7 @@ class Parser:
         export_history_path = os.path.join(project_root, 'var', 'logs')
         export_history_log = os.path.join(export_history_path, 'export_history.log')
         latest_timestamp = None
-        if not os.path.exists(export_history_path):
-            os.makedirs(export_history_path)
+        os.makedirs(export_history_path, exist_ok=True)
         
         if not os.path.isfile(export_history_log):
             open(export_history_log, 'a').close()
@@ -358,8 +720,7 @@ class Parser:
         export_history_path = os.path.join(project_root, 'var', 'logs')
         export_history_log = os.path.join(export_history_path, 'export_history.log')
 
-        if not os.path.exists(export_history_path):
-            os.makedirs(export_history_path)
+        os.makedirs(export_history_path, exist_ok=True)
 
         if self.get_latest_export_timestamp() != self.datestamp:
             with open(export_history_log, 'a', 1, 'utf-8') as hl:
@@ -367,7 +728,7 @@ class Parser:
 
         return
 
-    def export_neo4j_db_csv(self, dataset_name=str(), include_summary=False, batch_id=None):
+    def export_neo4j_db_csv(self, dataset_name=str(), include_summary=False, batch_id=None, parts=('node', 'edge')):
         '''
         Writes a single header/csv set of files for nodes and edges of the selected dataset.
         If the header already exists for the given name_base and self.datestamp, one is not created and data is appended to the corresponding data csv file (JR)
@@ -375,16 +736,15 @@ class Parser:
 
         dirpath = os.path.join(self.data_repo, 'csv_batches', self.datestamp)
 
-        if not os.path.exists(dirpath):
-            os.mkdir(dirpath)
+        os.makedirs(dirpath, exist_ok=True)
 
         filepaths = dict()
 
         # Throw an error if no dataset is specified
         if len(dataset_name) == 0:
             raise Exception('Dataset to export not specified.')
-        elif dataset_name not in self.export_vars:
-            raise Exception('Unknown dataset %(name)s.  Expected one of the following: %(opts)s' % {'name': dataset_name, 'opts': ', '.join(self.export_vars)})
+        elif dataset_name not in self.export_vars + ['category_tree']:
+            raise Exception('Unknown dataset %(name)s.  Expected one of the following: %(opts)s' % {'name': dataset_name, 'opts': ', '.join(self.export_vars + ['category_tree'])})
 
         # If no name is provided, construct one using the requested dataset (JR)
         name_base = 'n4db_%(dsn)s' % {'dsn': dataset_name}
@@ -399,7 +759,8 @@ class Parser:
                     'review_helpful_ratio_avg:float', 'review_helpful_ratio_sd:float',
                     'review_rating_avg_wtd:float', 'review_rating_wtd_avg:float', 'review_rating_wtd_sd:float', 'customers_unique_ct:int', ':LABEL'
                 ]),
-                'category'  : '\t'.join(['Id:ID(cat_id)', 'path:string', 'path_depth:int', ':LABEL']),
+                # Category nodes are the integer-keyed segments of the hierarchy (JR)
+                'category_tree' : '\t'.join(['Id:ID(cat_id){id-type:long}', 'name:string', 'path:string', 'path_depth:int', ':LABEL']),
                 'review'    : '\t'.join(['Id:ID(rev_id)', 'review_date:date', 'customer:string', 'rating:int', 'votes:int', 'helpful:int', 'helpful_ratio:float', 'review_rating_wtd:float', ':LABEL']),
                 'customer'  : '\t'.join([
                     'Id:ID(cust_id)', 'review_ct:int', 'review_mttr:float', 'helpful_avg:float', 'helpful_sd:float', 'rating_avg:float', 'rating_sd:float',
@@ -409,6 +770,7 @@ class Parser:
             'edge': {
                 'product'   : '\t'.join([':START_ID(asin_id)', ':END_ID(asin_id)', ':TYPE']),
                 'category'  : '\t'.join([':START_ID(asin_id)', ':END_ID(cat_id)', ':TYPE']),
+                'category_tree' : '\t'.join([':START_ID(cat_id)', ':END_ID(cat_id)', ':TYPE']),
                 'review'    : '\t'.join([':START_ID(asin_id)', ':END_ID(rev_id)', ':TYPE']),
                 'customer'  : '\t'.join([':START_ID(cust_id)', ':END_ID(rev_id)', ':TYPE'])
             },
@@ -420,6 +782,10 @@ class Parser:
             }
         }
 
+        # Integer ids are declared as such so neo4j-admin can index them as longs rather than strings (JR)
+        if self.id_scheme == 'hash64':
+            header_maps['node']['review'] = header_maps['node']['review'].replace('Id:ID(rev_id)', 'Id:ID(rev_id){id-type:long}')
+
         # Product nodes & edges
         file_labels = [item for sublist in [['_'.join([x,y]) for x in ['node', 'edge']] for y in ['header', 'data']] for item in sublist]
 
@@ -435,65 +801,68 @@ class Parser:
             }
         }
 
+        data_ext = '.csv' if self.csv_compression is None else '.csv.gz'
+
         if batch_id is None:
-            filepaths['node']['data'] = os.path.join(dirpath, '%(base)s_node_data.csv' % {'base': name_base})
-            filepaths['edge']['data'] = os.path.join(dirpath, '%(base)s_edge_data.csv' % {'base': name_base})
+            filepaths['node']['data'] = os.path.join(dirpath, '%(base)s_node_data%(ext)s' % {'base': name_base, 'ext': data_ext})
+            filepaths['edge']['data'] = os.path.join(dirpath, '%(base)s_edge_data%(ext)s' % {'base': name_base, 'ext': data_ext})
             filepaths['summary']['data'] = os.path.join(dirpath, '%(base)s_summary_data.csv' % {'base': name_base})
         else:
-            filepaths['node']['data'] = os.path.join(dirpath, '%(base)s_node_data_%(bid)s.csv' % {'base': name_base, 'bid': batch_id})
-            filepaths['edge']['data'] = os.path.join(dirpath, '%(base)s_edge_data_%(bid)s.csv' % {'base': name_base, 'bid': batch_id})
+            filepaths['node']['data'] = os.path.join(dirpath, '%(base)s_node_data_%(bid)s%(ext)s' % {'base': name_base, 'bid': batch_id, 'ext': data_ext})
+            filepaths['edge']['data'] = os.path.join(dirpath, '%(base)s_edge_data_%(bid)s%(ext)s' % {'base': name_base, 'bid': batch_id, 'ext': data_ext})
             filepaths['summary']['data'] = os.path.join(dirpath, '%(base)s_summary_data_%(bid)s.csv' % {'base': name_base, 'bid': batch_id})
 
-        #TODO: split node and data writes into separate functions to be run in parallel (JR)
-        if not os.path.isfile(filepaths['node']['header']):
-            with open(filepaths['node']['header'], 'w', 1, 'utf-8') as csv:
-                csv.write(header_maps['node'][dataset_name])
-
-        if not os.path.isfile(filepaths['edge']['header']):
-            with open(filepaths['edge']['header'], 'w', 1, 'utf-8') as csv:
-                csv.write(header_maps['edge'][dataset_name])
+        # Node and edge files are written by separate functions so that ExportAsync can run them in parallel (JR)
+        for part in parts:
+            if not os.path.isfile(filepaths[part]['header']):
+                with self.open_writer(filepaths[part]['header']) as csv:
+                    csv.write(header_maps[part][dataset_name])
 
         if include_summary and not os.path.isfile(filepaths['summary']['header']):
-            with open(filepaths['summary']['header'], 'w', 1, 'utf-8') as csv:
+            with self.open_writer(filepaths['summary']['header']) as csv:
                 csv.write(header_maps['summary'][dataset_name])
 
 
-        with open(filepaths['node']['data'], 'a', 1, 'utf-8') as csv:
-            print('Generating %(ds)s nodes.' % {'ds': dataset_name})
+        # Summary-only calls after a streamed merge pass no parts (JR)
+        if 'node' in parts:
+            self.write_neo4j_db_nodes(dataset_name, filepaths)
+
+        if 'edge' in parts:
+            self.write_neo4j_db_edges(dataset_name, filepaths)
+
+        if include_summary:
+            with self.open_writer(filepaths['summary']['data']) as sf:
+                output = '\t'.join(['\t'.join([str(y) for x,y in self.summaries[dataset_name].items()]), '_'.join(['SUMMARY', dataset_name.upper()])])
+                sf.write(output)
+
+    def write_neo4j_db_nodes(self, dataset_name, filepaths):
+        # Appends the node rows of the dataset's current table (or in-memory batch) to the export file (JR)
+        with self.open_writer(filepaths['node']['data'], 'a', compress=True) as csv:
             match dataset_name:
                 case 'product':
-                    for product in self.products:
-                        # Attempting to work around needing to map ASINs to IDs across multiple files by using ASINs as the node ID (JR)
-                        output = '\t'.join(['\t'.join([str(y).strip() for x,y in self.products[product].items() if not x == 'similar_to']), 'PRODUCT\n'])
-                        csv.write(output)
+                    # Attempting to work around needing to map ASINs to IDs across multiple files by using ASINs as the node ID (JR)
+                    csv.writelines('\t'.join([*row, 'PRODUCT\n']) for row in self.iter_table_rows(dataset_name, [x for x in self.merge_columns['product'] if x != 'similar_to']))
 
-                case 'category':
-                    for product in self.categories:
-                        for cat_id in self.categories[product]:
-                            output = '\t'.join([cat_id, '\t'.join([str(x) for x in self.categories[product][cat_id].values()]), 'CATEGORY\n'])
-                            csv.write(output)
+                case 'category_tree':
+                    # A segment has a row per parent and may be found by several workers; only its first row in batch order is written,
+                    # so the node's path does not depend on the order in which neo4j-admin meets the repeats (JR)
+                    rows = list(self.iter_table_rows(dataset_name, ['Id', 'name', 'path', 'path_depth']))
+                    mask = self.get_dedup_set('category_tree_nodes').add(np.fromiter((int(x[0]) for x in rows), dtype=np.int64, count=len(rows)))
+                    csv.writelines('\t'.join([*row, 'CATEGORY\n']) for row, keep in zip(rows, mask) if keep)
 
                 case 'review':
-                    for product_id in self.reviews:
-                        for rev_id in self.reviews[product_id]:
-                            output = '\t'.join([rev_id, '\t'.join([str(x).strip() for x in self.reviews[product_id][rev_id].values()]), 'REVIEW\n'])
-                            csv.write(output)
+                    csv.writelines('\t'.join([*row, 'REVIEW\n']) for row in self.iter_table_rows(dataset_name, ['Id', 'review_date', 'customer', 'rating', 'votes', 'helpful', 'helpful_ratio', 'review_rating_wtd']))
 
                 case 'customer':
-                    for customer_id in self.customers:
-                        output = '\t'.join([customer_id, '\t'.join([str(y).strip() for x,y in self.customers[customer_id].items() if not x == 'reviews']), 'CUSTOMER\n'])
-                        csv.write(output)
-
-        # TODO: Validate performance of set comprehension/generator vs traditional for loops (JR)
-        # Using set comprehension to ensure only unique tuples are output - was running into duplicates being created previously. (JR)
-        with open(filepaths['edge']['data'], 'a', 1, 'utf-8') as csv:
-            print('Generating %(ds)s edges.' % {'ds': dataset_name})
+                    csv.writelines('\t'.join([*row, 'CUSTOMER\n']) for row in self.iter_table_rows(dataset_name, [x for x in self.tables['customer'].column_names if x != 'reviews']))
+
+    def write_neo4j_db_edges(self, dataset_name, filepaths):
+        # Edges are de-duplicated by their (start, end) hash across every batch of the export - was running into duplicates being created previously. (JR)
+        with self.open_writer(filepaths['edge']['data'], 'a', compress=True) as csv:
             match dataset_name:
                 case 'product':
-                    # Construct set of unique edges (JR)
-                    edge_pairs = set('\t'.join([val['ASIN'], sim, 'IS_SIMILAR_TO\n']) for pid,val in self.products.items() for sim in val['similar_to'].split(';') if val['similar_to'] != '')
-                    for pair in edge_pairs:
-                        csv.write(pair)
+                    edge_pairs = [(asin, sim) for asin, similar_to in self.iter_table_rows(dataset_name, ['ASIN', 'similar_to']) for sim in similar_to.split(';') if similar_to != '']
+                    csv.writelines('\t'.join([*pair, 'IS_SIMILAR_TO\n']) for pair in self.dedup_edges(dataset_name, edge_pairs))
                     # for product_id in self.products:
                     #     # Attempting to work around needing to map ASINs to IDs across multiple files by using ASINs as the node ID (JR)
                     #     #TODO: CHANGE WORKFLOW TO COLLECT EDGE DATA AS {'<ASIN>': '<id>'} AND {'<ASIN>': '<sim_list>'}} THEN REMAP ASINS TO IDS AFTER ALL DATA HAS BEEN PARSED?
@@ -501,35 +870,72 @@ class Parser:
                     #         if sim_asin != '' and sim_asin is not None:
                     #             csv.write('\t'.join([self.products[product]['ASIN'], sim_asin, 'IS_SIMILAR_TO\n']))
                 case 'category':
-                    edge_pairs = set('\t'.join([self.products[pid]['ASIN'], cid, 'CATEGORIZED_AS\n']) for pid,pval in self.categories.items() for cid in pval)
-                    for pair in edge_pairs:
-                        csv.write(pair)
+                    edge_pairs = [tuple(x) for x in self.iter_table_rows(dataset_name, ['ASIN', 'Id'])]
+                    csv.writelines('\t'.join([*pair, 'CATEGORIZED_AS\n']) for pair in self.dedup_edges(dataset_name, edge_pairs))
                     # for product_id in self.categories:
                     #     for cat_id in self.categories[product_id].keys():
                     #         # csv.write('\t'.join([product_id, cat_id, 'CATEGORIZED_AS\n']))
                     #         csv.write('\t'.join([self.products[product_id]['ASIN'], cat_id, 'CATEGORIZED_AS\n']))
+                case 'category_tree':
+                    # Edges point from each segment to its parent; top-level segments have none (JR)
+                    edge_pairs = [tuple(x) for x in self.iter_table_rows(dataset_name, ['Id', 'parent_id']) if x[1] != '']
+                    csv.writelines('\t'.join([*pair, 'SUBCATEGORY_OF\n']) for pair in self.dedup_edges(dataset_name, edge_pairs))
                 case 'review':
-                    edge_pairs = set('\t'.join([self.products[pid]['ASIN'], rid, 'REVIEWED_BY\n']) for pid,pval in self.reviews.items() for rid in pval)
-                    for pair in edge_pairs:
-                        csv.write(pair)
+                    edge_pairs = [tuple(x) for x in self.iter_table_rows(dataset_name, ['ASIN', 'Id'])]
+                    csv.writelines('\t'.join([*pair, 'REVIEWED_BY\n']) for pair in self.dedup_edges(dataset_name, edge_pairs))
                     # for product_id in self.reviews:
                     #     for rev_id in self.reviews[product_id].keys():
                     #         # csv.write('\t'.join([product_id, rev_id, 'REVIEWED_BY\n']))
                     #         csv.write('\t'.join([self.products[product_id]['ASIN'], rev_id, 'REVIEWED_BY\n']))
                 case 'customer':
-                    edge_pairs = set('\t'.join([cid, rid, 'WROTE_REVIEW\n']) for cid,cval in self.customers.items() for rid in cval['reviews'].split(';') if cval['reviews'] != '')
-                    for pair in edge_pairs:
-                        csv.write(pair)
+                    if 'reviews' in self.tables['customer'].column_names:
+                        # Review id lists are flattened alongside the index of the customer each came from (JR)
+                        reviews = self.tables['customer'].column('reviews').combine_chunks()
+                        customer_ids = self.tables['customer'].column('Id').combine_chunks().take(pc.list_parent_indices(reviews))
+                        edge_pairs = [(cid, str(rid)) for cid, rid in zip(customer_ids.to_pylist(), pc.list_flatten(reviews).to_pylist())]
+                    else:
+                        # Edge-only exports take the pairs straight from the review columns without grouping by customer (JR)
+                        edge_pairs = [tuple(x) for x in self.iter_table_rows(dataset_name, ['customer', 'Id'])]
+                    csv.writelines('\t'.join([*pair, 'WROTE_REVIEW\n']) for pair in self.dedup_edges(dataset_name, edge_pairs))
                     # for customer_id, val in self.customers.items():
                     #     revs = val['reviews'].split(';')
                     #     for rev_id in revs:
                     #         csv.write('\t'.join([customer_id, rev_id, 'WROTE_REVIEW\n']))
                     #         #TODO: CREATE SEPARATE RELATION WITH PRODUCT IDS INCLUDED
 
-        if include_summary:
-            with open(filepaths['summary']['data'], 'w', 1, 'utf-8') as sf:
-                output = '\t'.join(['\t'.join([str(y) for x,y in self.summaries[dataset_name].items()]), '_'.join(['SUMMARY', dataset_name.upper()])])
-                sf.write(output)
+    def get_dedup_set(self, name):
+        # Keys already written under name, for every batch of the export (JR)
+        if name not in self.edge_sets.keys():
+            self.edge_sets[name] = SpillingHashSet(os.path.join(self.data_repo, 'csv_batches', self.datestamp, 'dedup_runs_%(n)s' % {'n': name}), self.dedup_budget_bytes)
+        return self.edge_sets[name]
+
+    def dedup_edges(self, dataset_name, edge_pairs):
+        # Keeps the first occurrence of each (start, end) pair seen so far for the dataset, in input order (JR)
+        edge_set = self.get_dedup_set(dataset_name)
+        duplicates, spill_runs = edge_set.duplicates, len(edge_set.runs)
+        mask = edge_set.add(np.fromiter((self.get_pair_key(*x) for x in edge_pairs), dtype=np.int64, count=len(edge_pairs)))
+
+        self.export_perf.increment_counter('edge duplicates dropped', edge_set.duplicates - duplicates)
+        self.export_perf.increment_counter('edge spill runs', len(edge_set.runs) - spill_runs)
+
+        return [x for x, keep in zip(edge_pairs, mask) if keep]
+
+    @staticmethod
+    def get_pair_key(src, dest):
+        '''
+        64-bit key of an edge.  Pairs of non-negative ids below 2**31 (e.g. Amazon category ids) are packed exactly as (src << 32) | dest;
+        any other pair is keyed by a blake2b hash of both ids, which is stable across processes and runs.  Hashed keys can collide,
+        dropping a real edge: for n distinct edges the chance of any collision is about n**2 / 2**65, i.e. roughly 3e-4 for 1e8 edges (JR)
+        '''
+        # Leading zeros (as in many ASINs) would be lost by int(), so only canonical integers are packed (JR)
+        if all(x.isdigit() and str(int(x)) == x and int(x) < 2**31 for x in (src, dest)):
+            return (int(src) << 32) | int(dest)
+        return int.from_bytes(hl.blake2b('\t'.join([src, dest]).encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+    def clear_edge_sets(self, dataset=None):
+        # Node id sets are kept under '<dataset>_nodes' (JR)
+        for ds in [x for x in list(self.edge_sets.keys()) if dataset is None or x in [dataset, '%(ds)s_nodes' % {'ds': dataset}]]:
+            self.edge_sets.pop(ds).clear()
 
     def dump_neo4j_db_csvs(self, batch_id=None):
         # Exporting all datasets (JR)
@@ -541,222 +947,716 @@ class Parser:
 
         self.log_export_timestamp()
 
-    def dump_json(self, batch_id = None):
-        for subset in self.export_vars:
-            output_path = os.path.join(self.data_repo, 'json_batches', self.datestamp)
-            if not os.path.exists(output_path):
-                os.makedirs(output_path)
-
-            with open(os.path.join(output_path, '%(s)s_%(bid)s.json' % {'s': subset, 'bid': batch_id}), 'w', 1, 'utf-8') as f:
-                match subset:
-                    case 'product':
-                        json.dump(self.products, f)
-                        self.products = dict()
-                    case 'category':
-                        json.dump(self.categories, f)
-                        self.categories = dict()
-                    case 'review':
-                        json.dump(self.reviews, f)
-                        self.reviews = dict()
-                    case 'customer':
-                        json.dump(self.customer_history, f)
-                        self.customer_history = dict()
-                    case _:
-                        continue
+    def get_store(self, timestamp=None):
+        return ColumnStore(os.path.join(self.data_repo, 'parquet_batches', self.datestamp if timestamp is None else timestamp), self.parquet_compression, self.id_scheme == 'hash64')
 
-        self.log_export_timestamp()
-
-        return
+    def get_batch_columns(self, entity):
+        # Flattens the in-memory records into the entity's columns, keeping the product id/ASIN on child rows (JR)
+        fields = [x.name for x in entity_schemas[entity]]
+        columns = {x: list() for x in fields}
 
-    def collate_data(self, timestamp, subset):
-        collated_data = dict()
-        repo_path = os.path.join(self.data_repo, 'json_batches', timestamp)
-        repo_files = os.listdir(repo_path)
+        match entity:
+            case 'product':
+                for pid, val in self.products.items():
+                    columns['Id'].append(pid)
+                    for x in fields[1:]:
+                        columns[x].append(getattr(val, x))
 
-        for f in [x for x in repo_files if x.startswith(subset)]:
-            batch_id = re.findall('(?<=_)\d+(?=\.json)', f)[0]
+            case 'category':
+                for pid, pval in self.categories.items():
+                    for cval in pval.values():
+                        columns['product_id'].append(pid)
+                        columns['ASIN'].append(self.products[pid].ASIN)
+                        columns['Id'].append(cval.category_id)
+                        columns['path'].append(cval.path)
+                        columns['path_depth'].append(cval.path_depth)
+
+            case 'category_tree':
+                for val in self.category_tree:
+                    columns['Id'].append(val.segment_id)
+                    for x in fields[1:]:
+                        columns[x].append(getattr(val, x))
 
-            if batch_id not in collated_data.keys():
-                collated_data[batch_id] = dict()
+            case 'review':
+                for pid, pval in self.reviews.items():
+                    for rid, rval in pval.items():
+                        columns['product_id'].append(pid)
+                        columns['ASIN'].append(self.products[pid].ASIN)
+                        columns['Id'].append(rid)
+                        for x in fields[3:]:
+                            columns[x].append(getattr(rval, x))
+
+        return columns
+
+    def get_table(self, subset):
+        # Merge-stage tables are used when present, otherwise the current in-memory batch is converted (JR)
+        if subset in self.tables:
+            return self.tables[subset]
+
+        return self.get_store().build_table(subset, self.get_batch_columns(subset))
+
+    def iter_table_rows(self, subset, columns):
+        # Yields rows of the requested columns as lists of strings, with missing values left empty (JR)
+        table = self.get_table(subset)
+        values = [table.column(x).to_pylist() for x in columns]
+        for row in zip(*values):
+            yield ['' if x is None else str(x).strip() for x in row]
+
+    def dump_batch(self, batch_id = None):
+        store = self.get_store()
+        counts = dict()
+        files = [store.get_batch_path(x, batch_id) for x in ['product', 'category', 'category_tree', 'review']]
+
+        # Files are recorded before they are written, so a worker killed mid-segment still leaves a manifest naming all of them (JR)
+        if self.manifest is not None:
+            self.manifest['outputs'] = self.manifest['outputs'] + files
+            self.write_manifest(self.manifest)
+
+        # Customers are not stored separately; they are read back from the review columns during the merge (JR)
+        for subset in ['product', 'category', 'category_tree', 'review']:
+            columns = self.get_batch_columns(subset)
+            if subset == 'review':
+                counts['customer'] = len(set(columns['customer']))
+
+            counts[subset] = store.write_batch(subset, batch_id, columns)
+
+        self.batch_log.append({
+            'batch_id'  : batch_id,
+            'counts'    : {x: counts[x] for x in self.export_vars},
+            'files'     : files
+        })
 
-            with open(os.path.join(repo_path, f), 'r', 1, 'utf-8') as collection:
-                collated_data[batch_id] = json.load(collection)
+        self.products = dict()
+        self.categories = dict()
+        self.reviews = dict()
+        self.batch_bytes = 0
+        # Segments stay interned for the worker's later batches; only their new tree rows are written once (JR)
+        self.category_tree = list()
 
-        # Sort the batches once collated (JR)
-        collated_data = {x:collated_data[x] for x in sorted(collated_data)}
-        # Remove the outer dictionary layer (JR)
-        collated_data = {b:c for a in collated_data for b,c in collated_data[a].items()}
+        return
 
-        return collated_data
+    def get_manifest_path(self, segment_idx):
+        return os.path.join(self.get_store().repo_path, 'manifests', 'segment_%(i)s.json' % {'i': str(segment_idx).zfill(6)})
+
+    def read_manifest(self, segment_idx):
+        manifest_path = self.get_manifest_path(segment_idx)
+        if not os.path.isfile(manifest_path):
+            return None
+
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def write_manifest(self, manifest):
+        # Written to a temporary file and renamed so that a crash never leaves a partial manifest behind (JR)
+        manifest_path = self.get_manifest_path(manifest['segment'])
+        # Pool workers may create the directory concurrently (JR)
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+
+        with self.open_writer(manifest_path + '.tmp') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    def get_progress_path(self, stage):
+        # Live progress of the run's pool workers, combined by ProgressMonitor into progress.json (JR)
+        return os.path.join(project_root, 'var', 'progress', '%(s)s_%(d)s' % {'s': stage, 'd': self.datestamp})
+
+    def get_input_stat(self, filename, byte_range=None):
+        # Size and modification time of the source file along with the settings that shape the segment's output.  Cheap to
+        # take, so a resumed run compares it first and only hashes the input when it differs, as make and rsync do (JR)
+        # Passed through JSON so the byte range tuples compare equal to the lists read back from the manifest (JR)
+        stat = os.stat(filename)
+        return json.loads(json.dumps({'batch_size': self.batch_size, 'batch_budget_bytes': self.batch_budget_bytes, 'id_scheme': self.id_scheme, 'byte_range': byte_range, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}))
+
+    def get_input_hash(self, filename, byte_range=None):
+        # Hash of the segment's source bytes along with the settings that shape its output (JR)
+        input_hash = hl.blake2b(digest_size=16)
+        input_hash.update(json.dumps({'batch_size': self.batch_size, 'batch_budget_bytes': self.batch_budget_bytes, 'id_scheme': self.id_scheme, 'byte_range': byte_range}).encode('utf-8'))
+
+        with open(filename, 'rb') as f:
+            if byte_range is None:
+                for block in iter(lambda: f.read(self.write_buffer_bytes), b''):
+                    input_hash.update(block)
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for start, end in ([byte_range] if isinstance(byte_range, tuple) else byte_range):
+                        input_hash.update(mm[start:end])
+
+        return input_hash.hexdigest()
+
+    def remove_outputs(self, manifest):
+        for output_file in manifest.get('outputs', list()):
+            if os.path.isfile(output_file):
+                os.remove(output_file)
+
+    def collate_data(self, timestamp, subset, columns=None):
+        # Yields the subset's batches in sorted order as tables of only the requested columns (JR)
+        store = self.get_store(timestamp)
+        for batch_id, table in store.iter_batches(subset, columns):
+            yield table
+            # Export progress is counted in whole batches, as stored on disk (JR)
+            if self.progress is not None:
+                self.progress.update(os.path.getsize(store.get_batch_path(subset, batch_id)), table.num_rows)
+
+    def init_summary_state(self, subset, timestamp=None):
+        # Accumulators carried across merge batches in place of the full collated dataset (JR)
+        match subset:
+            case 'product':
+                return {'review_counts': BatchStat()}
+            case 'category':
+                return {'path_depths': BatchStat()}
+            case 'review':
+                return {'products_reviewed': 0, 'customer_ids': set()}
+            case 'customer':
+                # Review columns are spilled to sorted runs keyed by customer rather than grouped in memory (JR)
+                return {'runs': SortedRuns(os.path.join(self.get_store(timestamp).repo_path, 'customer_runs'), 'customer', self.parquet_compression)}
 
-    def export_with_summary(self, subset):
+    def update_summary_state(self, subset):
+        table = self.tables[subset]
+        state = self.summary_state[subset]
 
         match subset:
             case 'product':
                 # Only considering those items which actually have reviews associated with them (JR)
-                review_counts = [int(y['review_total_ct']) for x,y in self.products.items() if len(y['review_total_ct']) > 0]
-                unique_customer_counts = [0 if y['customers_unique'] == '' else int(y['customers_unique']) for x,y in self.products.items()]
+                state['review_counts'].add(table.column('review_total_ct').drop_null().to_numpy())
+
+            case 'category':
+                state['path_depths'].add(table.column('path_depth').to_numpy())
+
+            case 'review':
+                # products_reviewed is the number of distinct products with at least one review.  The original in-memory summary
+                # counted product-category rows (it iterated self.categories), which did not match the column's name (JR)
+                # A product's reviews are always flushed together, so per-batch distinct counts can be summed (JR)
+                state['products_reviewed'] += len(table.column('product_id').unique())
+                state['customer_ids'].update(table.column('customer').unique().to_pylist())
+
+            case 'customer':
+                state['runs'].add_run(table)
+
+    def summarise_customers(self, reviews):
+        '''
+        Per-customer statistics for a table of review columns sorted by customer, with every review of each customer present.
+        Customers are contiguous segments of the flat arrays, so each statistic is one reduction over all segments.  Values are
+        summed in the order np.mean() and np.std() use, so results match the former per-customer summaries bit for bit (JR)
+        '''
+        customers = reviews.column('customer')
+        n = reviews.num_rows
+        # Segment start positions, where the customer differs from the previous row (JR)
+        changed = pc.not_equal(customers.slice(1), customers.slice(0, n - 1)).to_numpy(zero_copy_only=False)
+        starts = np.concatenate([[0], np.flatnonzero(changed) + 1])
+        counts = np.diff(np.append(starts, n))
+        # Segment bounds as Python ints, which slice faster than numpy scalars in the per-customer loops below (JR)
+        bounds = list(zip(starts.tolist(), np.append(starts[1:], n).tolist()))
+        long_segments = np.flatnonzero(counts >= 8).tolist()
+
+        def segment_sum(values):
+            # np.sum() adds fewer than 8 values in sequence and switches to pairwise summation from 8, where the few longer
+            # segments are summed by np.sum() itself.  np.add.reduceat() follows neither order, and rounding ties then differ (JR)
+            sums = np.zeros(len(starts))
+            for k in range(7):
+                in_segment = np.flatnonzero(counts > k)
+                sums[in_segment] += values[starts[in_segment] + k]
+            for i in long_segments:
+                sums[i] = np.sum(values[bounds[i][0]:bounds[i][1]])
+            return sums
+
+        def segment_mean(values):
+            return segment_sum(values) / counts
+
+        def segment_std(values, means):
+            # Population standard deviation, as np.std() (JR)
+            return np.sqrt(segment_sum(np.square(values - np.repeat(means, counts))) / counts)
+
+        days            = pc.cast(reviews.column('review_date'), pa.int32()).to_numpy().astype(np.float64)
+        helpful_resp    = reviews.column('helpful').to_numpy().astype(np.float64)
+        ratings         = reviews.column('rating').to_numpy().astype(np.float64)
+        votes           = reviews.column('votes').to_numpy().astype(np.float64)
+        helpful_ratios  = reviews.column('helpful_ratio').to_numpy().astype(np.float64)
+
+        helpful_avg         = segment_mean(helpful_resp)
+        rating_avg          = segment_mean(ratings)
+        votes_total         = segment_sum(votes)
+        votes_avg           = votes_total / counts
+        helpful_ratio_total = segment_sum(helpful_ratios)
+        helpful_ratio_avg   = helpful_ratio_total / counts
+
+        # The mean gap between sorted review dates only depends on the first and last date (JR)
+        date_span = np.maximum.reduceat(days, starts) - np.minimum.reduceat(days, starts)
+        review_mttr = np.divide(date_span, counts - 1, out=np.zeros(len(starts)), where=counts > 1)
+
+        # Weighted rating is left at 0 when the customer's first review has no helpful votes, as before.  np.dot() may use the
+        # fused multiply-adds of the BLAS, which no reduction here reproduces, so it is still taken per customer of several reviews (JR)
+        weighted = helpful_ratios[starts] != 0
+        rating_dot = ratings[starts] * helpful_ratios[starts]
+        for i in np.flatnonzero(weighted & (counts > 1)).tolist():
+            rating_dot[i] = np.dot(ratings[bounds[i][0]:bounds[i][1]], helpful_ratios[bounds[i][0]:bounds[i][1]])
+        rating_wtd = np.divide(rating_dot, helpful_ratio_total, out=np.zeros(len(starts)), where=weighted)
+
+        return pa.table({
+            'Id'                : customers.take(pa.array(starts)).cast(pa.string()),
+            'reviews'           : pa.ListArray.from_arrays(pa.array(np.append(starts, n), type=pa.int32()), reviews.column('Id').combine_chunks()),
+            'review_ct'         : counts,
+            'review_mttr'       : np.round(review_mttr, self.precision),
+            'helpful_avg'       : np.round(helpful_avg, self.precision),
+            'helpful_sd'        : np.round(segment_std(helpful_resp, helpful_avg), self.precision),
+            'rating_avg'        : np.round(rating_avg, self.precision),
+            'rating_sd'         : np.round(segment_std(ratings, rating_avg), self.precision),
+            'rating_wtd'        : np.round(rating_wtd, self.precision),
+            'votes_total'       : votes_total.astype(np.int64),
+            'votes_avg'         : np.round(votes_avg, self.precision),
+            'votes_sd'          : np.round(segment_std(votes, votes_avg), self.precision),
+            'helpful_ratio_avg' : np.round(helpful_ratio_avg, self.precision),
+            'helpful_ratio_sd'  : np.round(segment_std(helpful_ratios, helpful_ratio_avg), self.precision)
+        })
+
+    def export_with_summary(self, subset, parts=('node', 'edge')):
+        state = self.summary_state.pop(subset)
 
+        match subset:
+            case 'product':
                 self.summaries['product'] = {
-                    'review_ct'     : int(np.sum(review_counts)),
-                    'review_ct_avg' : round(np.mean(review_counts), self.precision),
-                    'review_ct_sd'  : round(np.std(review_counts), self.precision)
+                    'review_ct'     : int(state['review_counts'].get_sum()),
+                    'review_ct_avg' : round(state['review_counts'].get_mean(), self.precision),
+                    'review_ct_sd'  : round(state['review_counts'].get_std(), self.precision)
                 }
 
             case 'category':
-                path_depths = [y[z]['path_depth'] for x,y in self.categories.items() for z in y]
-
                 self.summaries['category'] = {
-                    'path_depth_avg': round(np.mean(path_depths), self.precision),
-                    'path_depth_sd' : round(np.std(path_depths), self.precision)
+                    'path_depth_avg': round(state['path_depths'].get_mean(), self.precision),
+                    'path_depth_sd' : round(state['path_depths'].get_std(), self.precision)
                 }
 
             case 'review':
-                customer_ids = set(y[z]['customer'] for x,y in self.reviews.items() for z in y)
-
                 self.summaries['review'] = {
-                    'products_reviewed'         : len([y[z] for x,y in self.categories.items() for z in y]),
-                    'review_unique_customers'   : len(customer_ids)
+                    'products_reviewed'         : state['products_reviewed'],
+                    'review_unique_customers'   : len(state['customer_ids'])
                 }
 
             case 'customer':
-                customer_review_cts = list()
-                customer_vote_cts = list()
-                customer_helpful_ratios = list()
-
-                for cid in self.customers:
-                    review_dates = list()
-                    helpful_resp = list()
-                    ratings = list()
-                    votes = list()
-                    helpful_ratios = list()
-
-                    if cid not in self.customers.keys():
-                        self.customers[cid] = dict()
-
-                    review_dates    = [datetime.strptime(y['review_date'], '%Y-%m-%d') for x,y in self.customers[cid].items()]
-                    days_between_reviews = [x.days for x in np.ediff1d([d for d in sorted(review_dates)])]
-                    helpful_resp    = [int(y['helpful']) for x,y in self.customers[cid].items()]
-                    ratings         = [int(y['rating']) for x,y in self.customers[cid].items()]
-                    votes           = [int(y['votes']) for x,y in self.customers[cid].items()]
-                    helpful_ratios  = [float(y['helpful_ratio']) for x,y in self.customers[cid].items()]
-
-                    self.customers[cid] = {
-                        'reviews'           : ';'.join([x for x in self.customers[cid]]),
-                        'review_ct'         : len(review_dates),
-                        'review_mttr'       : 0 if len(days_between_reviews) == 0 else round(np.mean(days_between_reviews), self.precision),
-                        'helpful_avg'       : round(np.mean(helpful_resp), self.precision),
-                        'helpful_sd'        : round(np.std(helpful_resp), self.precision),
-                        'rating_avg'        : round(np.mean(ratings), self.precision),
-                        'rating_sd'         : round(np.std(ratings), self.precision),
-                        'rating_wtd'        : 0 if helpful_ratios[0] in ['', 0] else round(np.dot(ratings, helpful_ratios)/np.sum(helpful_ratios), self.precision),
-                        'votes_total'       : int(np.sum(votes)),
-                        'votes_avg'         : round(np.mean(votes), self.precision),
-                        'votes_sd'          : round(np.std(votes), self.precision),
-                        'helpful_ratio_avg' : round(np.mean(helpful_ratios), self.precision),
-                        'helpful_ratio_sd'  : round(np.std(helpful_ratios), self.precision)
-                    }
-
-                    # customer_review_cts.append(self.customers[cid]['review_ct'])
-                    # customer_vote_cts.append(self.customers[cid]['votes_total'])
-                    # customer_helpful_ratios.append(self.customers[cid]['helpful_ratio_avg'])
-
-                customer_review_cts =       [self.customers[x]['review_ct'] for x in self.customers]
-                customer_vote_cts =         [self.customers[x]['votes_total'] for x in self.customers]
-                customer_helpful_ratios =   [self.customers[x]['helpful_ratio_avg'] for x in self.customers]
+                customer_review_cts = BatchStat()
+                customer_vote_cts = BatchStat()
+                customer_helpful_ratios = BatchStat()
+
+                # One pass over the merged runs; every review of a customer arrives in the same chunk regardless of its batch (JR)
+                for chunk in state['runs'].iter_chunks():
+                    self.tables['customer'] = self.summarise_customers(chunk)
+
+                    customer_review_cts.add(self.tables['customer'].column('review_ct').to_numpy())
+                    customer_vote_cts.add(self.tables['customer'].column('votes_total').to_numpy())
+                    customer_helpful_ratios.add(self.tables['customer'].column('helpful_ratio_avg').to_numpy())
+
+                    # Customer nodes and edges are appended chunk by chunk so only one chunk is held at once (JR)
+                    self.export_neo4j_db_csv(dataset_name=subset, parts=parts)
+                    self.tables.pop('customer')
+
+                state['runs'].clear()
 
                 self.summaries['customer'] = {
-                    'review_ct_avg'     : round(np.mean(customer_review_cts), self.precision),
-                    'review_ct_sd'      : round(np.std(customer_review_cts), self.precision),
-                    'votes_avg'         : round(np.mean(customer_vote_cts), self.precision),
-                    'votes_sd'          : round(np.std(customer_vote_cts), self.precision),
-                    'helpful_ratio_avg' : round(np.mean(customer_helpful_ratios), self.precision),
-                    'helpful_ratio_sd'  : round(np.std(customer_helpful_ratios), self.precision)
+                    'review_ct_avg'     : round(customer_review_cts.get_mean(), self.precision),
+                    'review_ct_sd'      : round(customer_review_cts.get_std(), self.precision),
+                    'votes_avg'         : round(customer_vote_cts.get_mean(), self.precision),
+                    'votes_sd'          : round(customer_vote_cts.get_std(), self.precision),
+                    'helpful_ratio_avg' : round(customer_helpful_ratios.get_mean(), self.precision),
+                    'helpful_ratio_sd'  : round(customer_helpful_ratios.get_std(), self.precision)
                 }
 
-        self.export_neo4j_db_csv(dataset_name=subset, include_summary=True)
+        # Node and edge data has already been appended batch by batch (JR)
+        self.export_neo4j_db_csv(dataset_name=subset, include_summary=True, parts=())
 
-    def merge(self, timestamp=None, subset=None):
+    def merge(self, timestamp=None, subset=None, parts=('node', 'edge')):
+        '''
+        Streams the subset's batches into the neo4j-admin CSVs. Summaries are produced along with the nodes;
+        an edge-only merge reads just the edge columns so that ExportAsync can run it alongside the node merge (JR)
+        '''
         if timestamp is None:
             timestamp = self.get_latest_export_timestamp()
         
         if subset is not None:
-            # Collate and combine batches (JR)
-            match subset:
-                case 'product':
-                    self.products = self.collate_data(timestamp, subset)
-                case 'category':
-                    self.categories = self.collate_data(timestamp, subset)
-                case 'review':
-                    self.reviews = self.collate_data(timestamp, subset)
-                case 'customer':
-                    self.customers = self.collate_data(timestamp, subset)
-
-            self.export_with_summary(subset)
+            nodes = 'node' in parts
+            # category_tree is merged as part of category and has no summary of its own (JR)
+            summarise = nodes and subset in self.export_vars
+            # Category nodes come from the category tree rather than the product-category rows (JR)
+            export_parts = tuple(x for x in parts if subset != 'category' or x != 'node')
+            # Stream the batches in sorted order, reading only the columns used by the summary and export (JR)
+            # Peak memory is one batch plus the summary accumulators rather than the whole collated subset (JR)
+            if summarise:
+                self.summary_state[subset] = self.init_summary_state(subset, timestamp)
+            self.export_perf = PerfMon('Parser.merge_%(s)s_%(p)s' % {'s': subset, 'p': '_'.join(parts)})
+            self.export_perf.add_timelog_event('init')
+            # Reported once per subset rather than for every batch appended (JR)
+            for part in export_parts:
+                print('Generating %(ds)s %(p)ss.' % {'ds': subset, 'p': part})
+
+            for table in self.collate_data(timestamp, subset, self.merge_columns[subset] if nodes else self.edge_columns[subset]):
+                self.export_perf.add_timelog_event('read batch')
+                self.tables[subset] = table
+                if summarise:
+                    self.update_summary_state(subset)
+
+                # Customer nodes can only be written once their reviews from every batch have been merged (JR)
+                if subset != 'customer' or not nodes:
+                    self.export_neo4j_db_csv(dataset_name=subset, parts=export_parts)
+
+                # Freeing up memory before the next batch is read (JR)
+                self.tables.pop(subset)
+                self.export_perf.add_timelog_event('export batch')
+
+            if summarise:
+                self.export_with_summary(subset, parts)
+            self.clear_datasets(subset)
+            self.clear_edge_sets(subset)
+
+            self.export_perf.add_timelog_event('end')
+            self.export_perf.log_all()
+
+            # The hierarchy's nodes and SUBCATEGORY_OF edges are exported with the same parts as the categories (JR)
+            if subset == 'category':
+                self.merge(timestamp, 'category_tree', parts)
 
         else:
             raise Exception('Dataset to merge not specified.')
 
     def similar_asin_to_id(self):
         # translates ASIN values to ids generated during parsing, adds new property to product metadata
-        base_map = {self.products[x]['ASIN']:x for x in self.products}
+        base_map = {self.products[x].ASIN:x for x in self.products}
         for product in self.products:
-            sim_asins = self.products[product]['similar_to']
-            if sim_asins != '':
-                self.products[product]['similar_to_ids'] = ';'.join([base_map[x] for x in sim_asins.split(';') if x in base_map.keys()])
+            sim_asins = self.products[product].similar_to
+            if sim_asins not in [None, '']:
+                self.products[product].similar_to_ids = ';'.join([base_map[x] for x in sim_asins.split(';') if x in base_map.keys()])
+
+
+# Worker-local parser; each pool process builds its own via init_parse_worker() rather than unpickling a shared one per task (JR)
+worker_parser = None
+
+
+def init_parse_worker(batch_size, datestamp):
+    global worker_parser
+    worker_parser = Parser(batch_size=batch_size, datestamp=datestamp)
+    worker_parser.progress = get_reporter(worker_parser.get_progress_path('parse'), 'parse', worker_parser.progress_interval)
+
+
+def get_segment_bytes(filename, byte_range=None):
+    # Size of a parse task's input as stored on disk, used for its progress and ETA (JR)
+    if byte_range is None:
+        return os.path.getsize(filename)
+    return sum(end - start for start, end in ([byte_range] if isinstance(byte_range, tuple) else byte_range))
+
+
+def parse_segment(task):
+    # Map step: parse one split file or byte range and return a compact summary of what was written to disk (JR)
+    segment_idx, filename, byte_range = task
+
+    # Clear anything left over from a previous task handled by this worker (JR)
+    worker_parser.clear_datasets()
+    worker_parser.batch_log = list()
+    worker_parser.progress.start_task('segment_%(i)s' % {'i': str(segment_idx).zfill(6)}, get_segment_bytes(filename, byte_range))
+
+    # Segments completed by an earlier run are skipped when their input is unchanged and their outputs are still present (JR)
+    manifest = worker_parser.read_manifest(segment_idx)
+    input_stat = worker_parser.get_input_stat(filename, byte_range)
+    completed = manifest is not None and manifest['status'] == 'complete' and all(os.path.isfile(x) for x in manifest['outputs'])
+    if completed and manifest.get('input_stat') == input_stat:
+        worker_parser.progress.finish_task(skipped=True)
+        return {**manifest['result'], 'skipped': True}
+
+    # The input is only read in full to hash it when its size or modification time has changed, e.g. after a copy or touch (JR)
+    input_hash = worker_parser.get_input_hash(filename, byte_range)
+    if completed and manifest['input_hash'] == input_hash:
+        worker_parser.write_manifest({**manifest, 'input_stat': input_stat})
+        worker_parser.progress.finish_task(skipped=True)
+        return {**manifest['result'], 'skipped': True}
+
+    # Anything left from a failed, interrupted or outdated run of this segment is replaced (JR)
+    if manifest is not None:
+        worker_parser.remove_outputs(manifest)
+
+    manifest = {'segment': segment_idx, 'file': filename, 'byte_range': byte_range, 'input_hash': input_hash, 'input_stat': input_stat, 'status': 'running', 'outputs': list()}
+    worker_parser.write_manifest(manifest)
+
+    # The running manifest lists every batch file as it is written, so outputs of a run that was killed are removed too (JR)
+    worker_parser.manifest = manifest
+    try:
+        worker_parser.load_split(filename, byte_range=byte_range, segment_idx=None if byte_range is None else segment_idx, log_results=False)
+    except Exception:
+        worker_parser.write_manifest({**worker_parser.manifest, 'status': 'failed', 'error': traceback.format_exc()})
+        worker_parser.progress.fail_task()
+        # Tracebacks do not survive pickling back to the parent, so embed it in the message (JR)
+        raise Exception('Parsing segment %(i)s of %(f)s failed:\n%(tb)s' % {'i': segment_idx, 'f': filename, 'tb': traceback.format_exc()})
+    finally:
+        worker_parser.manifest = None
+
+    result = {
+        'segment'   : segment_idx,
+        'file'      : filename,
+        'byte_range': byte_range,
+        'batches'   : worker_parser.batch_log,
+        'lines'     : worker_parser.parser_perf.counter['parse line'],
+        'duration'  : round(worker_parser.parser_perf.timelog[-1][0] - worker_parser.parser_perf.timelog[0][0], 4),
+        'skipped'   : False
+    }
+
+    worker_parser.write_manifest({
+        **manifest,
+        'status'    : 'complete',
+        'outputs'   : [f for b in worker_parser.batch_log for f in b['files']],
+        'counts'    : {ds: sum(b['counts'][ds] for b in worker_parser.batch_log) for ds in worker_parser.export_vars},
+        'result'    : result
+    })
+    worker_parser.progress.finish_task()
+
+    return result
 
 
 class ParseAsync():
-    def __init__(self):
+    def __init__(self, batch_size=1000, datestamp=None):
         self.results = list()
         self.process_cap = 1 if cpu_count() == 1 else cpu_count() - 1
+        self.batch_size = batch_size
+        # Passing the datestamp of an earlier run resumes it, re-parsing only segments without a matching complete manifest (JR)
+        self.datestamp = datetime.now().strftime('%Y%m%d_%H%M%S') if datestamp is None else datestamp
+
+    def parse_async_apply(self, files):
+        # Sorting keeps segment numbering stable between runs (JR)
+        return self.run([(i, f, None) for i, f in enumerate(sorted(files))])
+
+    def parse_async_mmap(self, filename):
+        # Skips the split_file() stage entirely; workers read their byte ranges straight from the memory-mapped source file (JR)
+        parser = Parser(batch_size=self.batch_size, datestamp=self.datestamp)
+
+        # A compressed source cannot be memory-mapped, so it is streamed once into split_data batches which are parsed instead (JR)
+        if get_compression(filename) is not None:
+            parser.split_file(filename)
+            split_path = os.path.join(parser.data_repo, 'split_data')
+            return self.parse_async_apply([os.path.join(split_path, f) for f in os.listdir(split_path)])
+
+        offsets = parser.find_chunk_offsets(filename)
+
+        # Build (or refresh) the sidecar record index so subsets can later be re-parsed via Parser.load_records() (JR)
+        parser.get_record_index(filename)
+
+        return self.run([(i, filename, byte_range) for i, byte_range in enumerate(offsets)])
+
+    @staticmethod
+    def get_resume_datestamp():
+        # Latest run that recorded segment manifests, if any (JR)
+        batch_repo = os.path.join(project_root, 'data', 'parquet_batches')
+        if not os.path.exists(batch_repo):
+            return None
+
+        resumable = [x for x in sorted(os.listdir(batch_repo)) if os.path.isdir(os.path.join(batch_repo, x, 'manifests'))]
+        return resumable[-1] if len(resumable) > 0 else None
+
+    def remove_stale_segments(self, parser):
+        # Segments from an earlier run that no longer exist (e.g. the source shrank) would otherwise be merged again (JR)
+        segments = set(r['segment'] for r in self.results)
+        manifest_path = os.path.dirname(parser.get_manifest_path(0))
+
+        for f in os.listdir(manifest_path) if os.path.exists(manifest_path) else list():
+            segment_idx = re.findall('(?<=^segment_)\d+(?=\.json$)', f)
+            if len(segment_idx) > 0 and int(segment_idx[0]) not in segments:
+                parser.remove_outputs(parser.read_manifest(int(segment_idx[0])))
+                os.remove(os.path.join(manifest_path, f))
+
+    def run(self, tasks):
+        perf = PerfMon('ParseAsync.run')
+        perf.add_timelog_event('init')
+        parser = Parser(batch_size=self.batch_size, datestamp=self.datestamp)
+        # Workers report to their own progress files, which are combined here while the pool runs (JR)
+        monitor = ProgressMonitor(
+            parser.get_progress_path('parse'), 'parse', len(tasks), sum(get_segment_bytes(f, r) for i, f, r in tasks),
+            parser.progress_interval, parser.progress_stall
+        )
+        monitor.start()
+        # Unlike multiprocessing.Pool, which waits forever for the result of a worker that was killed outright (e.g. by the
+        # OOM killer), the executor marks itself broken and raises BrokenProcessPool from result() (JR)
+        executor = ProcessPoolExecutor(self.process_cap, initializer=init_parse_worker, initargs=(self.batch_size, self.datestamp))
 
+        try:
+            # Results are consumed as they complete; a worker exception is re-raised here rather than silently dropped (JR)
+            for future in as_completed([executor.submit(parse_segment, task) for task in tasks]):
+                result = future.result()
+                self.collect_results(result)
+                perf.add_timelog_event('skip segment' if result['skipped'] else 'parse segment')
+                perf.increment_counter('skip segment' if result['skipped'] else 'parse segment')
+        finally:
+            # After a failure the queued segments are cancelled; those already running finish and record their manifests (JR)
+            executor.shutdown(cancel_futures=True)
+            monitor.stop()
 
-    def load_split(self, parser, i, file):
-        # Wrapper for Parser.load_split() which enables for passing back of an iteration number for Pool.apply_async()
-        parser.load_split(file)
-        return i
+        perf.add_timelog_event('end')
+        perf.log_all()
 
-    def parse_async_apply(self, files):
-        pool = Pool(self.process_cap)
-        parser = Parser()
+        return self.reduce_results()
+
+    def collect_results(self, result):
+        self.results.append(result)
+
+    def reduce_results(self):
+        # Reduce step: order by segment so the summary is identical regardless of worker completion order (JR)
+        self.results = sorted(self.results, key=lambda x: x['segment'])
+        parser = Parser(batch_size=self.batch_size, datestamp=self.datestamp)
+
+        self.remove_stale_segments(parser)
+
+        summary = {
+            'datestamp' : self.datestamp,
+            'segments'  : len(self.results),
+            'skipped'   : sum(1 for r in self.results if r['skipped']),
+            'batches'   : [b['batch_id'] for r in self.results for b in r['batches']],
+            'lines'     : sum(r['lines'] for r in self.results),
+            'counts'    : {ds: sum(b['counts'][ds] for r in self.results for b in r['batches']) for ds in parser.export_vars},
+            'results'   : self.results
+        }
+
+        output_path = os.path.join(parser.data_repo, 'parquet_batches', self.datestamp)
+        os.makedirs(output_path, exist_ok=True)
+
+        with parser.open_writer(os.path.join(output_path, 'parse_summary.json')) as f:
+            json.dump(summary, f, indent=2)
+
+        parser.log_export_timestamp()
+
+        return summary
+
+
+def export_subset(task):
+    # Runs one node or edge merge of a subset in a pool worker; workers share the run's datestamp so all files land in one directory (JR)
+    datestamp, timestamp, subset, parts, task_bytes = task
+    parser = Parser(datestamp=datestamp)
+    parser.progress = get_reporter(parser.get_progress_path('export'), 'export', parser.progress_interval)
+    parser.progress.start_task('%(s)s_%(p)s' % {'s': subset, 'p': '_'.join(parts)}, task_bytes)
+
+    try:
+        parser.merge(timestamp=timestamp, subset=subset, parts=parts)
+    except Exception:
+        parser.progress.fail_task()
+        # Tracebacks do not survive pickling back to the parent, so embed it in the message (JR)
+        raise Exception('Exporting %(p)s data for %(s)s failed:\n%(tb)s' % {'p': '/'.join(parts), 's': subset, 'tb': traceback.format_exc()})
+    parser.progress.finish_task()
+
+    return {
+        'subset'    : subset,
+        'parts'     : parts,
+        'summary'   : parser.summaries[subset] if 'node' in parts else None,
+        'duration'  : round(parser.export_perf.timelog[-1][0] - parser.export_perf.timelog[0][0], 4)
+    }
+
+
+class ExportAsync():
+    # Rough ratio of in-memory size to Parquet size for a decoded batch and the rows built from it (JR)
+    batch_expansion = 10
+
+    def __init__(self, timestamp):
+        self.timestamp = timestamp
+        self.datestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.parser = Parser(datestamp=self.datestamp)
+        workers = int(config.get('parser', 'export_workers'))
+        self.process_cap = workers if workers > 0 else (1 if cpu_count() == 1 else cpu_count() - 1)
+        self.memory_budget = int(config.get('parser', 'export_memory_mb')) * 1024 * 1024
+        self.results = list()
+
+    def get_batch_sizes(self, subset):
+        store = self.parser.get_store(self.timestamp)
+        return [os.path.getsize(store.get_batch_path(subset, b)) for b in store.list_batches(subset)]
+
+    def get_tasks(self):
+        # One node task and one edge task per subset; each is costed by its largest batch and ordered by its total input size (JR)
+        tasks = list()
+        for subset in self.parser.export_vars:
+            batch_sizes = self.get_batch_sizes(subset)
+            # The category merge goes on to read the category_tree batches, which count towards its progress (JR)
+            task_bytes = sum(batch_sizes) + (sum(self.get_batch_sizes('category_tree')) if subset == 'category' else 0)
+            for parts in [('node',), ('edge',)]:
+                memory = max(batch_sizes, default=0) * self.batch_expansion + (self.parser.dedup_budget_bytes if 'edge' in parts else 0)
+                tasks.append({'task': (self.datestamp, self.timestamp, subset, parts, task_bytes), 'memory': memory, 'size': sum(batch_sizes)})
+
+        # Starting the largest subsets first keeps the wall clock close to that of the largest one (JR)
+        return sorted(tasks, key=lambda x: x['size'], reverse=True)
+
+    def run(self):
+        perf = PerfMon('ExportAsync.run')
+        perf.add_timelog_event('init')
+        pending = self.get_tasks()
+        running = list()
+        monitor = ProgressMonitor(
+            self.parser.get_progress_path('export'), 'export', len(pending), sum(x['task'][-1] for x in pending),
+            self.parser.progress_interval, self.parser.progress_stall
+        )
+        monitor.start()
+        # A worker killed outright breaks the executor, which then raises BrokenProcessPool rather than waiting forever (JR)
+        executor = ProcessPoolExecutor(self.process_cap)
 
-        # Initial parsing phase
         try:
-            for i, f in enumerate(files):
-                pool.apply_async(self.load_split, args=(parser, i, f), callback=self.collect_results)
+            while len(pending) > 0 or len(running) > 0:
+                # Admit pending tasks while workers and memory allow; a task is always started when nothing else is running (JR)
+                memory_used = sum(x['memory'] for x, r in running)
+                for task in list(pending):
+                    if len(running) >= self.process_cap:
+                        break
+                    if len(running) == 0 or memory_used + task['memory'] <= self.memory_budget:
+                        running.append((task, executor.submit(export_subset, task['task'])))
+                        memory_used += task['memory']
+                        pending.remove(task)
+
+                # Only a finished task frees workers or memory, so wait for the next one before admitting more (JR)
+                wait([future for task, future in running], return_when=FIRST_COMPLETED)
+                for task, future in [x for x in running if x[1].done()]:
+                    # result() re-raises a worker exception here rather than silently dropping it (JR)
+                    self.collect_results(future.result())
+                    running.remove((task, future))
+                    perf.add_timelog_event('export task')
+                    perf.increment_counter('export task')
         finally:
-            pool.close()
-            # Wait until all processes have finished
-            pool.join()
+            executor.shutdown(cancel_futures=True)
+            monitor.stop()
+
+        perf.add_timelog_event('end')
+        perf.log_all()
+
+        return self.reduce_results()
 
-        return
-    
     def collect_results(self, result):
         self.results.append(result)
 
+    def reduce_results(self):
+        for result in self.results:
+            if result['summary'] is not None:
+                self.parser.summaries[result['subset']] = result['summary']
+
+        return self.parser.summaries
+
 
 def main(mode='parse'):
     parser = Parser()
-    json_repo = os.path.join(prj_root, 'data', 'json_batches')
+    batch_repo = os.path.join(project_root, 'data', 'parquet_batches')
+    # With resume_parse enabled, reruns continue the latest run with manifests, re-parsing only failed, interrupted or modified
+    # segments; otherwise every run parses into a fresh datestamp directory (JR)
+    resume_datestamp = ParseAsync.get_resume_datestamp() if config.getboolean('parser', 'resume_parse') else None
+    if resume_datestamp is not None and mode in ['parse_async_apply', 'parse_async_mmap']:
+        print('Resuming parse run %(d)s.' % {'d': resume_datestamp})
 
     match mode:
         case 'split':
-            parser.split_file(filename=os.path.join(project_root, 'data', 'amazon-meta.txt'))
+            parser.split_file(filename=parser.find_source_file())
 
         case 'parse_async_apply':
             print('Parsing source data file via apply_async.')
-            async_parser = ParseAsync()
+            async_parser = ParseAsync(datestamp=resume_datestamp)
             async_parser.parse_async_apply([os.path.join(project_root, 'data', 'split_data', f) for f in os.listdir(os.path.join(project_root, 'data', 'split_data'))])
 
+        case 'parse_async_mmap':
+            print('Parsing source data file via memory-mapped byte ranges.')
+            async_parser = ParseAsync(datestamp=resume_datestamp)
+            async_parser.parse_async_mmap(parser.find_source_file())
+
         case 'merge':
-            latest_datasets = [x for x in sorted(os.listdir(json_repo))]
+            latest_datasets = [x for x in sorted(os.listdir(batch_repo))]
             if len(latest_datasets) > 0:
-                for ds in parser.export_vars:
-                    print('Collating and exporting %(ds)s data.' % {'ds': ds})
-                    parser.merge(timestamp=latest_datasets[-1], subset=ds)
+                # Node and edge exports of every subset run concurrently, within the configured worker count and memory budget (JR)
+                print('Collating and exporting %(ds)s data.' % {'ds': ', '.join(parser.export_vars)})
+                export_async = ExportAsync(timestamp=latest_datasets[-1])
+                export_async.run()
             else:
-                print('No datasets present within %(path)s to parse.' % {'path': json_repo})
+                print('No datasets present within %(path)s to parse.' % {'path': batch_repo})
 
         case 'convert':
             # Importing prior export from JSON (JR)
@@ -768,12 +1668,9 @@ def main(mode='parse'):
 
    
 if __name__ == "__main__":
-    # Stage 1: Initial parsing and structuring of data (JR)
-    #   Breaks up source file into topic-specific groups split into smaller file sizes (JR)
-    main('split')
-
-    # Stage 2: Asynchronously parse structured files (JR)
-    main('parse_async_apply')
+    # Stage 1 & 2: Asynchronously parse byte ranges of the memory-mapped source file (JR)
+    #   Replaces the prior main('split') followed by main('parse_async_apply'), which remain available (JR)
+    main('parse_async_mmap')
 
     # Stage 3: Collate, merge, postprocessing, and summarization of data (JR)
     #   Also generates Customer node data derived from Review node data and provides deduplication (JR)
@@ -1,9 +1,14 @@
 import os
 import re
+import json
+import atexit
 import logging
+import itertools
+import contextlib
 import configparser as cfg
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 from neo4j import GraphDatabase as gdb
 from neo4j.exceptions import ServiceUnavailable
 
@@ -13,17 +18,159 @@ config_path = os.path.join(project_root, 'etc', 'config.ini')
 config = cfg.ConfigParser()
 config.read(config_path)
 
+from acpPerfMon import PerfMon
+
+# Labels and relationship types cannot be passed as parameters, so only these are interpolated into write queries (JR)
+# Each label is merged on its indexed key; each relationship type joins a fixed pair of labels (JR)
+node_keys = {'PRODUCT': 'ASIN', 'CATEGORY': 'Id', 'REVIEW': 'Id', 'CUSTOMER': 'Id'}
+edge_types = {
+    'IS_SIMILAR_TO'     : ('PRODUCT', 'PRODUCT'),
+    'CATEGORIZED_AS'    : ('PRODUCT', 'CATEGORY'),
+    'SUBCATEGORY_OF'    : ('CATEGORY', 'CATEGORY'),
+    'REVIEWED_BY'       : ('PRODUCT', 'REVIEW'),
+    'WROTE_REVIEW'      : ('CUSTOMER', 'REVIEW')
+}
+# Read queries take every value as a $parameter; property keys and operators are checked against these before being interpolated (JR)
+comparison_operators = ['<', '<=', '=', '>=', '>', '<>']
+property_keys_path = os.path.join(project_root, 'etc', 'node_property_keys.json')
+property_keys = dict()
+if os.path.isfile(property_keys_path):
+    with open(property_keys_path, 'r', 1, 'utf-8') as f:
+        property_keys = json.load(f)
+
+# One driver, and so one connection pool, per process and endpoint; forked workers build their own rather than sharing sockets (JR)
+drivers = dict()
+
+
+def get_driver():
+    endpoint = ''.join(['bolt://', config.get('database_connection', 'dbhost'), ':', config.get('database_connection', 'dbport')])
+    key = (os.getpid(), endpoint)
+    if key not in drivers:
+        drivers[key] = gdb.driver(
+            endpoint,
+            auth=(config.get('database_connection', 'dbuser'), config.get('database_connection', 'dbpass')),
+            max_connection_pool_size=int(config.get('database_connection', 'pool_size')),
+            connection_acquisition_timeout=float(config.get('database_connection', 'acquisition_timeout_s'))
+        )
+    return drivers[key]
+
+
+@atexit.register
+def close_drivers():
+    for key in [x for x in drivers if x[0] == os.getpid()]:
+        drivers.pop(key).close()
+
+# Column types of the larger read results, filled directly from the fetched records rather than through a dict per row (JR)
+result_schemas = {
+    '_get_user_product_ratings' : pa.schema([('cust_id', pa.string()), ('asin', pa.string()), ('rating', pa.int64())]),
+    '_get_cf_set_from_asins'    : pa.schema([('asin', pa.string()), ('cust_id', pa.string()), ('rating', pa.int64())]),
+    '_get_titles_from_asins'    : pa.schema([('asin', pa.string()), ('title', pa.string())]),
+    '_get_rating_greater'       : pa.schema([('asin', pa.string()), ('title', pa.string())]),
+    '_get_users_rating_average' : pa.schema([('cust_id', pa.string()), ('rating_avg', pa.float64())])
+}
+
+
+class ReplayTransaction:
+    '''
+    Stands in for a transaction when an N4J._get_* function is called outside the driver. It records the query the
+    function runs and hands back the given records, so the Cypher and the row handling stay defined once, in N4J (JR)
+    '''
+    def __init__(self, records=None):
+        self.records = list() if records is None else records
+        self.queries = list()
+
+    def run(self, cypher, **params):
+        self.queries.append((cypher, params))
+        return self.records
+
+
+def get_query(transaction_fn, *args):
+    # The query text and parameters a transaction function would run, after its identifiers have been checked (JR)
+    capture = ReplayTransaction()
+    transaction_fn(capture, *args)
+    return capture.queries[0]
+
+
+def pivot_ratings(ratings):
+    # Product x customer rating matrix from rows of (asin, cust_id, rating), as a DataFrame or list of dicts (JR)
+    return pd.pivot_table(pd.DataFrame(ratings), values='rating', index='asin', columns='cust_id')
+
+
+def fill_missing_ratings(ratings, usr_rating_avg=None):
+    # Missing ratings take each customer's average rating when averages are given, and 0 otherwise (JR)
+    if usr_rating_avg is None:
+        return ratings.replace(np.nan, 0)
+
+    usr_rating_avg = pd.pivot_table(usr_rating_avg, values='rating_avg', columns='cust_id')
+    for col in ratings.columns:
+        ratings[col] = ratings[col].fillna(usr_rating_avg[col]['rating_avg'])
+    return ratings
+
+
+def check_identifier(value, allowed, kind):
+    # Guards the parts of a query that Cypher cannot parameterise (JR)
+    if value not in allowed:
+        raise Exception('Unknown %(k)s %(v)s.  Expected one of the following: %(a)s' % {'k': kind, 'v': value, 'a': ', '.join(str(x) for x in allowed)})
+    return value
+
 class N4J:
     def __init__(self):
         self.endpoint = ''.join(['bolt://', config.get('database_connection', 'dbhost'), ':', config.get('database_connection', 'dbport')])
-        self.driver = gdb.driver(
-            self.endpoint,
-            auth=(config.get('database_connection', 'dbuser'), config.get('database_connection', 'dbpass'))
-        )
+        # Shared by every N4J in the process, so repeated queries reuse pooled connections instead of opening new ones (JR)
+        self.driver = get_driver()
+        self.database = config.get('database_connection', 'dbname')
+        self.fetch_size = int(config.get('database_connection', 'fetch_size'))
+        # Set while inside shared_session(), which lets several calls run in the one session (JR)
+        self.active_session = None
         self.default_query_limit = int(config.get('app', 'default_query_limit'))
+        # Online ingest sends ingest_batch_rows rows per UNWIND and commits every ingest_batches_per_tx batches (JR)
+        self.ingest_batch_rows = int(config.get('database_connection', 'ingest_batch_rows'))
+        self.ingest_batches_per_tx = int(config.get('database_connection', 'ingest_batches_per_tx'))
+        self.indices_added = False
 
     def close(self):
-        self.driver.close()
+        # The driver is shared by the process and closed at exit by close_drivers(); only an open shared session is ended here (JR)
+        if self.active_session is not None:
+            self.active_session.close()
+            self.active_session = None
+
+    @contextlib.contextmanager
+    def session(self):
+        # Naming the database saves a round trip to resolve the home database when a session starts (JR)
+        if self.active_session is not None:
+            yield self.active_session
+        else:
+            with self.driver.session(database=self.database, fetch_size=self.fetch_size) as session:
+                yield session
+
+    @contextlib.contextmanager
+    def shared_session(self):
+        '''
+        Runs every N4J call made inside the block in one session, e.g.
+            with n4.shared_session():
+                ratings = n4.get_cf_set_from_asins(asins)
+                titles = n4.get_titles_from_asins(asins)
+        Nested blocks reuse the outer session (JR)
+        '''
+        if self.active_session is not None:
+            yield self
+            return
+
+        with self.driver.session(database=self.database, fetch_size=self.fetch_size) as session:
+            self.active_session = session
+            try:
+                yield self
+            finally:
+                self.active_session = None
+
+    def read_together(self, *calls):
+        '''
+        Runs several read transaction functions in a single transaction, so they see the same snapshot, e.g.
+            groups, categories = n4.read_together((N4J._get_user_product_groups, uid), (N4J._get_user_product_categories, uid))
+        Returns their raw results in call order (JR)
+        '''
+        with self.session() as session:
+            return session.execute_read(lambda transaction: [fn(transaction, *args) for fn, *args in calls])
     
     # Derived from https://neo4j.com/docs/python-manual/current/get-started/ (JR)
     def enable_log(level, output_stream):
@@ -33,37 +180,63 @@ class N4J:
         logging.getLogger('neo4j').setLevel(level)
 
     def add_indices(self):
-        with self.driver.session() as session:
+        with self.session() as session:
             result = session.execute_write(self._add_indices)
         return
 
-    def add_node(self, idx, node_data):
-        with self.driver.session() as session:
-            result = session.execute_write(self._create_acp_n4_node, idx, node_data)
+    @staticmethod
+    def get_node_row(idx, node_data):
+        # The dataset key is kept as the node Id unless the properties already carry one (JR)
+        return {'Id': idx, **node_data}
+
+    def write_batches(self, transaction_fn, rows, perf, event, *args):
+        '''
+        Sends rows to transaction_fn in lists of ingest_batch_rows, committing every ingest_batches_per_tx lists.
+        All transactions share one session, and execute_write() retries a transaction on transient errors, which MERGE makes safe (JR)
+        '''
+        if not self.indices_added:
+            self.add_indices()
+            self.indices_added = True
+
+        rows = iter(rows)
+        with self.session() as session:
+            while True:
+                batches = list()
+                while len(batches) < self.ingest_batches_per_tx:
+                    batch = list(itertools.islice(rows, self.ingest_batch_rows))
+                    if len(batch) == 0:
+                        break
+                    batches.append(batch)
+
+                if len(batches) == 0:
+                    break
+
+                session.execute_write(transaction_fn, *args, batches)
+                perf.add_timelog_event('commit')
+                perf.increment_counter(event, sum(len(x) for x in batches))
+
+    def add_node(self, idx, node_data, label='PRODUCT'):
+        with self.session() as session:
+            result = session.execute_write(self._merge_acp_n4_nodes, label, [[self.get_node_row(idx, node_data)]])
             return result # Switch to log? (JR)
 
-    def add_node_set(self, node_dataset):
-        # Thin wrapper around add_node() to capture timing data (JR)
+    def add_node_set(self, node_dataset, label='PRODUCT'):
+        # Nodes are merged thousands at a time rather than one transaction each (JR)
         perf = PerfMon('N4J.add_node_set')
         perf.add_timelog_event('init')
-        for node in node_dataset:
-            self.add_node(node, node_dataset[node])
-            perf.add_timelog_event('add node')
-            perf.increment_counter('add node')
+        self.write_batches(self._merge_acp_n4_nodes, (self.get_node_row(idx, node_dataset[idx]) for idx in node_dataset), perf, 'add node', label)
         perf.add_timelog_event('end')
         perf.log_all()
 
     def add_edge(self, source, destination, relation_str):
-        with self.driver.session() as session:
-            result = session.execute_write(self._create_acp_n4_edge, source, destination, relation_str)
+        with self.session() as session:
+            result = session.execute_write(self._merge_acp_n4_edges, relation_str, [[{'src': source, 'dest': destination}]])
 
     def add_edges(self, edgelist, relation_str):
+        # Edges are merged thousands at a time, each endpoint found through its label's indexed key (JR)
         perf = PerfMon('N4J.add_edges')
         perf.add_timelog_event('init')
-        for pair in edgelist:
-            self.add_edge(pair[0], pair[1], relation_str)
-            perf.add_timelog_event('add edge')
-            perf.increment_counter('add edge')
+        self.write_batches(self._merge_acp_n4_edges, ({'src': pair[0], 'dest': pair[1]} for pair in edgelist), perf, 'add edge', relation_str)
         perf.add_timelog_event('end')
         perf.log_all()
 
@@ -74,89 +247,128 @@ class N4J:
         perf.add_timelog_event('end')
         perf.log_all()
 
+    @staticmethod
+    def read_record_batches(result, schema, batch_rows):
+        # Pulls batch_rows records at a time and puts their values straight into typed columns, without a dict per row (JR)
+        names = result.keys()
+        while True:
+            rows = [record.values() for record in itertools.islice(result, batch_rows)]
+            if len(rows) == 0:
+                break
+            columns = list(zip(*rows))
+            if schema is None:
+                yield pa.RecordBatch.from_arrays([pa.array(x) for x in columns], names=names)
+            else:
+                # The schema's columns are taken by name, whatever their order in the RETURN clause (JR)
+                yield pa.RecordBatch.from_arrays([pa.array(columns[names.index(f.name)], type=f.type) for f in schema], schema=schema)
+
+    def iter_batches(self, transaction_fn, *args, schema=None, batch_rows=None):
+        '''
+        Streams the result of one of the _get_* queries as pyarrow RecordBatches of batch_rows rows (fetch_size by default),
+        so neither the whole result nor a dict per row is held.  This runs as an auto-commit query and is not retried: batches
+        already handed to the caller cannot be taken back, so a managed transaction could not safely replay it.
+        Use fetch_table() where the result fits in memory and a retried read is wanted (JR)
+        '''
+        cypher, params = get_query(transaction_fn, *args)
+        if schema is None:
+            schema = result_schemas.get(transaction_fn.__name__)
+        batch_rows = self.fetch_size if batch_rows is None else batch_rows
+
+        with self.session() as session:
+            yield from self.read_record_batches(session.run(cypher, params), schema, batch_rows)
+
+    def fetch_table(self, transaction_fn, *args, schema=None):
+        '''
+        Typed columns of the whole result, read in a managed transaction that execute_read() retries on transient errors.
+        The batches are built inside the transaction function, so a retry starts again from an empty list (JR)
+        '''
+        cypher, params = get_query(transaction_fn, *args)
+        if schema is None:
+            schema = result_schemas.get(transaction_fn.__name__)
+
+        with self.session() as session:
+            batches = session.execute_read(lambda transaction: list(self.read_record_batches(transaction.run(cypher, params), schema, self.fetch_size)))
+
+        # An empty result still carries the known columns (JR)
+        if len(batches) == 0:
+            return pa.table({x.name: pa.array([], type=x.type) for x in schema}) if schema is not None else pa.table({})
+        return pa.Table.from_batches(batches)
+
+    def fetch_frame(self, transaction_fn, *args, schema=None):
+        return self.fetch_table(transaction_fn, *args, schema=schema).to_pandas()
+
     def get_edge_types(self):
-        with self.driver.session() as session:
+        with self.session() as session:
             result = session.execute_read(self._get_acp_n4_edge_types)
         result = list(set(row['rel_type'] for row in result))
         return result
 
     def get_node_properties(self, node_label):
-        with self.driver.session() as session:
+        with self.session() as session:
             result = session.execute_read(self._get_node_properties, node_label.upper())
 
         result = list(set(prop for row in result for y,prop_lst in row[node_label].items() for prop in prop_lst if prop != 'Id'))
         return result
     
     def get_edge_properties(self, edge_type):
-        with self.driver.session() as session:
+        with self.session() as session:
             result = session.execute_read(self._get_edge_properties, edge_type.upper())
 
         result = list(set(prop for row in result for y,prop_lst in row[node_label].items() for prop in prop_lst if prop != 'Id'))
         return result
 
     def get_num_reviews(self,ASIN):
-        with self.driver.session() as session:
+        with self.session() as session:
             result = session.execute_read(self._get_num_reviews,ASIN)
         return result
 
     def get_user_product_ratings(self, limit=None, replace_nans_with_avg=False):
         if limit is None:
             limit = self.default_query_limit
-        with self.driver.session() as session:
-            result = session.execute_read(self._get_user_product_ratings, limit)
-            result = pd.pivot_table(pd.DataFrame(result), values='rating', index='asin', columns='cust_id')
+        result = pivot_ratings(self.fetch_frame(self._get_user_product_ratings, limit))
 
         # Conditional replacement on NaN values with each user's average rating (JR)
-        if replace_nans_with_avg:
-            usr_rating_avg = self.get_users_rating_average(list(result.columns))
-            usr_rating_avg = pd.pivot_table(usr_rating_avg, values='rating_avg', columns='cust_id')
-
-            for col in result.columns:
-                result[col].mask(result[col].isnull(), usr_rating_avg[col]['rating_avg'], inplace=True)
-        else:
-            result.replace(np.nan, 0)
-
-        return result
+        return fill_missing_ratings(result, self.get_users_rating_average(list(result.columns)) if replace_nans_with_avg else None)
     
     def get_random_customer_node(self, rating_lower=0, review_ct_lower=1, n_users=1):
-        with self.driver.session() as session:
+        with self.session() as session:
             result = session.execute_read(self._get_random_customer_node, rating_lower, review_ct_lower, n_users)
             # result = result[0]
         return result
 
     def get_product_groups(self):
-        with self.driver.session() as session:
+        with self.session() as session:
             result = session.execute_read(self._get_product_groups)
         return result
 
     def get_product_categories(self):
-        with self.driver.session() as session:
+        with self.session() as session:
             result = session.execute_read(self._get_product_categories)
         return result
 
     def get_products_in_groups(self, group_list):
-        with self.driver.session() as session:
-            result = session.execute_read(self._get_products_in_groups, group_list)
+        with self.session() as session:
+            result = session.execute_read(self._get_products_in_groups, [str(x) for x in group_list])
         return result
 
     def get_products_in_categories(self, category_list):
-        with self.driver.session() as session:
+        with self.session() as session:
             result = session.execute_read(self._get_products_in_categories, category_list)
         return result
     
     def get_user_product_groups(self, user_id):
-        with self.driver.session() as session:
+        with self.session() as session:
             result = session.execute_read(self._get_user_product_groups, user_id)
             result = list(set(result))
         return result
 
     def get_user_product_categories(self, user_id):
-        with self.driver.session() as session:
+        with self.session() as session:
             result = session.execute_read(self._get_user_product_categories, user_id)
         return result
 
     def get_user_product_groups_and_categories(self, user_id):
-        with self.driver.session() as session:
+        with self.session() as session:
             result = session.execute_read(self._get_user_product_groups_and_categories, user_id)
             result = {
                 'group'     : list(set(x['group'] for x in result)),
@@ -165,49 +377,29 @@ class N4J:
         return result
     
     def get_user_product_peer_groups_and_categories(self, user_id):
-        with self.driver.session() as session:
+        with self.session() as session:
             result = session.execute_read(self._get_user_product_peer_groups_and_categories, user_id)
         return result
 
     def get_cf_set_from_asins(self, asins, limit=None, min_review_ct=3, replace_nans_with_avg=False):
         if limit is None:
             limit = self.default_query_limit
-        with self.driver.session() as session:
-            result = session.execute_read(self._get_cf_set_from_asins, asins, limit, min_review_ct)
+        result = pivot_ratings(self.fetch_frame(self._get_cf_set_from_asins, [str(x) for x in asins], limit, min_review_ct))
 
         # Conditional replacement on NaN values with each user's average rating (JR)
-        if replace_nans_with_avg:
-            result = pd.pivot_table(pd.DataFrame(result), values='rating', index='asin', columns='cust_id')
-            usr_rating_avg = self.get_users_rating_average(list(set(result.columns)))
-            usr_rating_avg = pd.pivot_table(usr_rating_avg, values='rating_avg', columns='cust_id')
-
-            for col in result.columns:
-                result[col].fillna(usr_rating_avg[col].rating_avg, inplace=True)
-        else:
-            result = pd.pivot_table(pd.DataFrame(result), values='rating', index='asin', columns='cust_id').replace(np.nan, 0)
-
-        return result
+        return fill_missing_ratings(result, self.get_users_rating_average(list(result.columns)) if replace_nans_with_avg else None)
 
     def get_titles_from_asins(self, asins):
-        with self.driver.session() as session:
-            result = session.execute_read(self._get_titles_from_asins, asins)
-            result = pd.DataFrame(result)
-        return result
+        return self.fetch_frame(self._get_titles_from_asins, [str(x) for x in asins])
 
     def get_rating_greater(self, node, prop_key, rating, operand, limit=None):
         if limit is None:
             limit = self.default_query_limit
-        with self.driver.session() as session:
-            result = session.execute_read(self._get_rating_greater, node, prop_key, rating, operand, limit)
-            result = pd.DataFrame(result)
-
-        return result
+        # Values compare as numbers, as they did when they were written into the query text (JR)
+        return self.fetch_frame(self._get_rating_greater, node, prop_key, float(rating), operand, limit)
 
     def get_users_rating_average(self, user_ids):
-        with self.driver.session() as session:
-            result = session.execute_read(self._get_users_rating_average, user_ids)
-            result = pd.DataFrame(result)
-        return result
+        return self.fetch_frame(self._get_users_rating_average, [str(x) for x in user_ids])
 
     @staticmethod
     def _add_indices(transaction):
@@ -219,7 +411,13 @@ class N4J:
             'CREATE TEXT INDEX idx_text_product_title IF NOT EXISTS FOR (n:PRODUCT) ON (n.title);',
             'CREATE TEXT INDEX idx_text_review_id IF NOT EXISTS FOR (n:REVIEW) ON (n.Id);',
             'CREATE TEXT INDEX idx_text_review_customer IF NOT EXISTS FOR (n:REVIEW) ON (n.customer);',
-            'CREATE TEXT INDEX idx_text_category_path IF NOT EXISTS FOR (n:CATEGORY) ON (n.path);'
+            'CREATE TEXT INDEX idx_text_category_path IF NOT EXISTS FOR (n:CATEGORY) ON (n.path);',
+            # Category ids are the integer node ids of the category hierarchy (JR)
+            'CREATE INDEX idx_category_id IF NOT EXISTS FOR (n:CATEGORY) ON (n.Id);',
+            # Range indices back the MERGE lookups of the batched writes (JR)
+            'CREATE INDEX idx_product_asin IF NOT EXISTS FOR (n:PRODUCT) ON (n.ASIN);',
+            'CREATE INDEX idx_review_id IF NOT EXISTS FOR (n:REVIEW) ON (n.Id);',
+            'CREATE INDEX idx_customer_id IF NOT EXISTS FOR (n:CUSTOMER) ON (n.Id);'
         ]
         result = [transaction.run(c) for c in cyphers]
 
@@ -244,32 +442,27 @@ class N4J:
             raise
 
     @staticmethod
-    def _create_acp_n4_node(transaction, idx, label, node_data):
-        # Combine values by unpacking to get interpolation to work without additional string processing - merge operator ('|') only exists for Python 3.9+ (JR)
-        # Need to prepend with a character since neo4j does not allow for node names to start with numbers: https://neo4j.com/docs/cypher-manual/current/syntax/naming/ (JR)
-        # The node name can easily be replaced with another value, this is just to prototype the process before the data model is ready (JR)
-        # cypher = 'CREATE (%(idx)s:Product {ASIN:\'%(ASIN)s\', title:\'%(title)s\', group:\'%(group)s\', salesrank:\'%(salesrank)s\'})' % {**{'idx':'a_' + idx}, **node_data}
-        cypher = 'CREATE (Product:\'%(lab)s\' {ASIN:\'%(ASIN)s\', title:\'%(title)s\', group:\'%(group)s\', salesrank:\'%(salesrank)s\'})' % {**{'lab':label}, **node_data}
-        result = transaction.run(cypher)
+    def _merge_acp_n4_nodes(transaction, label, batches):
+        # One query text per label, so the plan is cached and reused for every batch (JR)
+        check_identifier(label, node_keys, 'node label')
+        cypher = 'UNWIND $rows AS row MERGE (n:%(lab)s {%(key)s: row.%(key)s}) SET n += row' % {'lab': label, 'key': node_keys[label]}
+        for batch in batches:
+            transaction.run(cypher, rows=batch).consume()
         return
-    
+
     @staticmethod
-    def _create_acp_n4_edge(transaction, src, dest, relation):
-        # Performance improvement?  Generate edges by all ASINs in 'similar' (JR)
-        # May require the 'similar' set of ASINs added to each node?  Restructuring of dict? (JR)
-        # Example:
-            # MATCH (a:PRODUCT)
-            # WHERE a.ASIN IN ['039474067X','0679730672','0679750541','1400030668','0896086704']
-            # RETURN COUNT(a)
-        # Mockup:
-            # MATCH (a:PRODUCT), (b:PRODUCT)
-            # WHERE b.ASIN IN a.similar
-            # CREATE (a)-[:%(rel)s]->(b)
-
-        # TODO: Add primary key for nodes; UNIQUE property (JR)
-        # Specify unique node id instead of letting neo4j define it - find out what the limitations of this are (JR)
-        cypher = 'MATCH (a:PRODUCT), (b:PRODUCT) WHERE a.ASIN = \'%(from)s\' AND b.ASIN = \'%(to)s\' CREATE (a)-[:%(rel)s]->(b)' % {'from':src, 'to':dest, 'rel':relation}
-        result = transaction.run(cypher)
+    def _merge_acp_n4_edges(transaction, relation, batches):
+        # Each endpoint is an index seek on its label's key rather than a MATCH (a),(b) scan per pair (JR)
+        check_identifier(relation, edge_types, 'relationship type')
+        src_label, dest_label = edge_types[relation]
+        cypher = ' '.join([
+            'UNWIND $rows AS row',
+            'MATCH (a:%(sl)s {%(sk)s: row.src})' % {'sl': src_label, 'sk': node_keys[src_label]},
+            'MATCH (b:%(dl)s {%(dk)s: row.dest})' % {'dl': dest_label, 'dk': node_keys[dest_label]},
+            'MERGE (a)-[:%(rel)s]->(b)' % {'rel': relation}
+        ])
+        for batch in batches:
+            transaction.run(cypher, rows=batch).consume()
         return
 
     @staticmethod
@@ -279,24 +472,26 @@ class N4J:
         return
 
     @staticmethod
-    def _get_rating_greater(transaction, node, prop_key, rating, operand, limit=None):
-        if limit is None:
-            limit = self.default_query_limit
+    def _get_rating_greater(transaction, node, prop_key, rating, operand, limit):
         # Adjusting to accommodate multiple node types and properties (JR)
-        base_query = 'MATCH (n:%(n)s) WHERE n.%(pk)s %(operand)s %(rating)s RETURN n LIMIT %(lim)s' % {'n': node, 'pk': prop_key, 'operand':operand, 'rating':rating, 'lim': limit}
+        # Only the label, property key and operator are interpolated, each from a fixed list, so the plan is cached per combination (JR)
+        check_identifier(node, node_keys, 'node label')
+        check_identifier(prop_key, property_keys.get(node, list()), '%(n)s property key' % {'n': node})
+        check_identifier(operand, comparison_operators, 'operator')
+        base_query = 'MATCH (n:%(n)s) WHERE n.%(pk)s %(operand)s $rating RETURN n LIMIT $limit' % {'n': node, 'pk': prop_key, 'operand': operand}
 
         match node:
             case 'PRODUCT':
                 # Specify unique node id instead of letting neo4j define it - find out what the limitations of this are
-                cypher = ' '.join(['CALL {', base_query, '} WITH n MATCH (n) RETURN DISTINCT n.ASIN AS asin, n.title AS title LIMIT %(lim)s;' % {'lim': limit}])
+                cypher = ' '.join(['CALL {', base_query, '} WITH n MATCH (n) RETURN DISTINCT n.ASIN AS asin, n.title AS title LIMIT $limit;'])
             case 'CATEGORY':
-                cypher = ' '.join(['CALL {', base_query, '} WITH n MATCH (n)<--(a:PRODUCT) RETURN DISTINCT a.ASIN AS asin, a.title AS title LIMIT %(lim)s;' % {'lim': limit}])
+                cypher = ' '.join(['CALL {', base_query, '} WITH n MATCH (n)<--(a:PRODUCT) RETURN DISTINCT a.ASIN AS asin, a.title AS title LIMIT $limit;'])
             case 'CUSTOMER':
-                cypher = ' '.join(['CALL {', base_query, '} WITH n MATCH (n)-->()<--(a:PRODUCT) RETURN DISTINCT a.ASIN AS asin, a.title AS title LIMIT %(lim)s;' % {'lim': limit}])
+                cypher = ' '.join(['CALL {', base_query, '} WITH n MATCH (n)-->()<--(a:PRODUCT) RETURN DISTINCT a.ASIN AS asin, a.title AS title LIMIT $limit;'])
             case 'REVIEW':
-                cypher = ' '.join(['CALL {', base_query, '} WITH n MATCH (n)<--(a:PRODUCT) RETURN DISTINCT a.ASIN AS asin, a.title AS title LIMIT %(lim)s;' % {'lim': limit}])
+                cypher = ' '.join(['CALL {', base_query, '} WITH n MATCH (n)<--(a:PRODUCT) RETURN DISTINCT a.ASIN AS asin, a.title AS title LIMIT $limit;'])
         # print(cypher)
-        result = transaction.run(cypher)
+        result = transaction.run(cypher, rating=rating, limit=limit)
 
         try:
             return [{
@@ -308,7 +503,7 @@ class N4J:
             raise
 
     def get_similar_product(self,ASIN):
-        with self.driver.session() as session:
+        with self.session() as session:
             result = session.execute_read(self._get_similar_product,ASIN)
         return result
 
@@ -316,9 +511,9 @@ class N4J:
     def _get_similar_product(transaction, ASIN):
         # Specify unique node id instead of letting neo4j define it - find out what the limitations of this are
         cypher = ' '.join([
-            'MATCH (:PRODUCT {ASIN: \'%(id)s\'})-[r:IS_SIMILAR_TO]->(product:PRODUCT) RETURN product.title AS TITLE, product.ASIN AS asin' % {'id': ASIN}
+            'MATCH (:PRODUCT {ASIN: $asin})-[r:IS_SIMILAR_TO]->(product:PRODUCT) RETURN product.title AS TITLE, product.ASIN AS asin'
             ])
-        result = transaction.run(cypher)
+        result = transaction.run(cypher, asin=ASIN)
 
         try:
             return [{
@@ -331,7 +526,7 @@ class N4J:
 
     @staticmethod
     def _get_node_properties(transaction, node_label):
-        cypher = 'MATCH (n:%(nl)s) RETURN KEYS(n) AS property_keys LIMIT 50;' % {'nl': node_label}
+        cypher = 'MATCH (n:%(nl)s) RETURN KEYS(n) AS property_keys LIMIT 50;' % {'nl': check_identifier(node_label, node_keys, 'node label')}
         result = transaction.run(cypher)
         try:
             return [{node_label: {
@@ -344,7 +539,7 @@ class N4J:
 
     @staticmethod
     def _get_edge_properties(transaction, edge_type):
-        cypher = 'MATCH ()-[r:%(et)s]->() RETURN KEYS(r) AS property_keys LIMIT 50;' % {'et': edge_type}
+        cypher = 'MATCH ()-[r:%(et)s]->() RETURN KEYS(r) AS property_keys LIMIT 50;' % {'et': check_identifier(edge_type, edge_types, 'relationship type')}
         result = transaction.run(cypher)
         try:
             return [{edge_type: {
@@ -359,9 +554,9 @@ class N4J:
     def _get_num_reviews(transaction, ASIN):
         # Specify unique node id instead of letting neo4j define it - find out what the limitations of this are
         cypher = ' '.join([
-            'MATCH (thing:PRODUCT {ASIN:\'%(id)s\'}) RETURN thing.review_ct AS Review_Count, thing.title AS Title' % {'id': ASIN}
+            'MATCH (thing:PRODUCT {ASIN: $asin}) RETURN thing.review_ct AS Review_Count, thing.title AS Title'
             ])
-        result = transaction.run(cypher)
+        result = transaction.run(cypher, asin=ASIN)
 
         try:
             return [{
@@ -374,8 +569,8 @@ class N4J:
 
     @staticmethod
     def _get_user_product_ratings(transaction, limit):
-        cypher = 'MATCH (a:REVIEW)<-[:REVIEWED_BY]-(b) RETURN a.customer AS cust_id, b.ASIN as asin, a.rating AS rating LIMIT %(lim)s;' % {'lim': limit}
-        result = transaction.run(cypher)
+        cypher = 'MATCH (a:REVIEW)<-[:REVIEWED_BY]-(b) RETURN a.customer AS cust_id, b.ASIN as asin, a.rating AS rating LIMIT $limit;'
+        result = transaction.run(cypher, limit=limit)
 
         try:
             return [{
@@ -394,8 +589,8 @@ class N4J:
 
     @staticmethod
     def _get_random_customer_node(transaction, rating_lower_limit=0, review_ct_lower_limit=1, n_usrs=1):
-        cypher = 'MATCH (a:CUSTOMER) WHERE a.rating_avg > %(rll)s AND a.review_ct > %(rcll)s RETURN a, rand() AS r ORDER BY r LIMIT %(lim)s;' % {'rll': rating_lower_limit, 'rcll': review_ct_lower_limit, 'lim': n_usrs}
-        result = transaction.run(cypher)
+        cypher = 'MATCH (a:CUSTOMER) WHERE a.rating_avg > $rating_lower AND a.review_ct > $review_ct_lower RETURN a, rand() AS r ORDER BY r LIMIT $limit;'
+        result = transaction.run(cypher, rating_lower=rating_lower_limit, review_ct_lower=review_ct_lower_limit, limit=n_usrs)
 
         try:
             return [row[0]['Id'] for row in result]
@@ -427,8 +622,8 @@ class N4J:
 
     @staticmethod
     def _get_products_in_groups(transaction, grp_list):
-        cypher = 'MATCH (a:PRODUCT) WHERE a.group IN [%(gl)s] RETURN a.ASIN as asin;' % {'gl': ','.join([x for x in grp_list])}
-        result = transaction.run(cypher)
+        cypher = 'MATCH (a:PRODUCT) WHERE a.group IN $groups RETURN a.ASIN as asin;'
+        result = transaction.run(cypher, groups=grp_list)
 
         try:
             return [row['asin'] for row in result]
@@ -438,8 +633,11 @@ class N4J:
 
     @staticmethod
     def _get_products_in_categories(transaction, cat_list):
-        cypher = 'MATCH (a:PRODUCT)-[:CATEGORIZED_AS]->(b:CATEGORY) WHERE b.path IN [%(cl)s] RETURN a.ASIN AS asin;' % {'cl': ','.join([x for x in cat_list])}
-        result = transaction.run(cypher)
+        # Categories are given as integer ids or paths; products in any subcategory are reached through SUBCATEGORY_OF, so a path prefix selects its whole subtree (JR)
+        cat_ids = [x for x in cat_list if isinstance(x, int)]
+        cat_paths = [str(x) for x in cat_list if not isinstance(x, int)]
+        cypher = 'MATCH (a:PRODUCT)-[:CATEGORIZED_AS]->(:CATEGORY)-[:SUBCATEGORY_OF*0..]->(b:CATEGORY) WHERE b.Id IN $category_ids OR b.path IN $category_paths RETURN DISTINCT a.ASIN AS asin;'
+        result = transaction.run(cypher, category_ids=cat_ids, category_paths=cat_paths)
 
         try:
             return [row['asin'] for row in result]
@@ -449,8 +647,8 @@ class N4J:
 
     @staticmethod
     def _get_user_product_groups(transaction, usr_id):
-        cypher = 'MATCH (a:CUSTOMER)-->(:REVIEW)<--(b:PRODUCT) WHERE a.Id = \'%(uid)s\' RETURN b.group AS group;' % {'uid': usr_id}
-        result = transaction.run(cypher)
+        cypher = 'MATCH (a:CUSTOMER)-->(:REVIEW)<--(b:PRODUCT) WHERE a.Id = $usr_id RETURN b.group AS group;'
+        result = transaction.run(cypher, usr_id=usr_id)
 
         try:
             return [row['group'] for row in result]
@@ -460,8 +658,8 @@ class N4J:
 
     @staticmethod
     def _get_user_product_categories(transaction, usr_id):
-        cypher = 'MATCH (a:CUSTOMER)-->(:REVIEW)<--(:PRODUCT)-->(b:CATEGORY) WHERE a.Id = \'%(uid)s\' RETURN b.path AS category;' % {'uid': usr_id}
-        result = transaction.run(cypher)
+        cypher = 'MATCH (a:CUSTOMER)-->(:REVIEW)<--(:PRODUCT)-->(b:CATEGORY) WHERE a.Id = $usr_id RETURN b.path AS category;'
+        result = transaction.run(cypher, usr_id=usr_id)
 
         try:
             return [row['category'] for row in result]
@@ -471,8 +669,8 @@ class N4J:
 
     @staticmethod
     def _get_user_product_groups_and_categories(transaction, usr_id):
-        cypher = 'MATCH p=(a:CUSTOMER)-[r:WROTE_REVIEW]->(:REVIEW)<-[:REVIEWED_BY]-(b:PRODUCT)-[:CATEGORIZED_AS]->(c:CATEGORY) WHERE a.Id = \'%(uid)s\' RETURN b.group AS group, c.path AS path' % {'uid': usr_id}
-        result = transaction.run(cypher)
+        cypher = 'MATCH p=(a:CUSTOMER)-[r:WROTE_REVIEW]->(:REVIEW)<-[:REVIEWED_BY]-(b:PRODUCT)-[:CATEGORIZED_AS]->(c:CATEGORY) WHERE a.Id = $usr_id RETURN b.group AS group, c.path AS path'
+        result = transaction.run(cypher, usr_id=usr_id)
 
         try:
             return [{
@@ -485,8 +683,8 @@ class N4J:
 
     @staticmethod
     def _get_user_product_peers(transaction, usr_id):
-        cypher = 'MATCH p=(a:CUSTOMER)-->(:REVIEW)<--(:PRODUCT)-->(:REVIEW)<--(b:CUSTOMER) WHERE a.Id = \'%(uid)s\' AND b.Id <> \'%(uid)s\' RETURN b.Id AS peer_id' % {'uid': usr_id}
-        result = transaction.run(cypher)
+        cypher = 'MATCH p=(a:CUSTOMER)-->(:REVIEW)<--(:PRODUCT)-->(:REVIEW)<--(b:CUSTOMER) WHERE a.Id = $usr_id AND b.Id <> $usr_id RETURN b.Id AS peer_id'
+        result = transaction.run(cypher, usr_id=usr_id)
 
         try:
             return [row['category'] for row in result]
@@ -496,8 +694,8 @@ class N4J:
 
     @staticmethod
     def _get_user_product_peer_groups_and_categories(transaction, usr_id):
-        cypher = 'MATCH (:CUSTOMER)-->(:REVIEW)<--(:PRODUCT)-->(:REVIEW)<--(:CUSTOMER)-->(:REVIEW)<--(a:PRODUCT)-->(b:CATEGORY) WHERE a.Id = \'%(uid)s\' AND b.Id <> \'%(uid)s\' RETURN a.group AS peer_grp, b.path AS peer_cat;' % {'uid': usr_id}
-        result = transaction.run(cypher)
+        cypher = 'MATCH (:CUSTOMER)-->(:REVIEW)<--(:PRODUCT)-->(:REVIEW)<--(:CUSTOMER)-->(:REVIEW)<--(a:PRODUCT)-->(b:CATEGORY) WHERE a.Id = $usr_id AND b.Id <> $usr_id RETURN a.group AS peer_grp, b.path AS peer_cat;'
+        result = transaction.run(cypher, usr_id=usr_id)
 
         try:
             return [{
@@ -522,8 +720,9 @@ class N4J:
         # // get product/customer/ratings edgelist for those customers
         # MATCH (a:PRODUCT)-->(b:REVIEW) WHERE a.ASIN IN [inner_asins]
         # RETURN a.ASIN AS asin, b.customer AS user_id, b.rating as rating
-        cypher = 'CALL {%(bq)s LIMIT %(bl)s} WITH asins MATCH (a:PRODUCT)-->(b:REVIEW) WHERE a.ASIN IN [asins] RETURN a.ASIN AS asin, b.customer AS cust_id, b.rating as rating' % {'bq': base_query, 'bl': base_limit}
-        result = transaction.run(cypher)
+        # base_query is itself a query, so it is the only part interpolated; the limit is a parameter (JR)
+        cypher = 'CALL {%(bq)s LIMIT $base_limit} WITH asins MATCH (a:PRODUCT)-->(b:REVIEW) WHERE a.ASIN IN [asins] RETURN a.ASIN AS asin, b.customer AS cust_id, b.rating as rating' % {'bq': base_query}
+        result = transaction.run(cypher, base_limit=base_limit)
 
         try:
             return [{
@@ -539,8 +738,8 @@ class N4J:
     def _get_cf_set_from_asins(transaction, asins, limit, rev_ct_min=3):
         # Variant of _get_cf_set_from_subquery which expects to receive a list of ASINs (JR)
         asins = asins[:limit]
-        cypher = 'MATCH (a:PRODUCT)-->(b:REVIEW) WHERE a.ASIN IN %(al)s AND a.review_ct >= %(rcm)s RETURN a.ASIN AS asin, b.customer AS cust_id, b.rating as rating' % {'al': asins, 'rcm': rev_ct_min}
-        result = transaction.run(cypher)
+        cypher = 'MATCH (a:PRODUCT)-->(b:REVIEW) WHERE a.ASIN IN $asins AND a.review_ct >= $rev_ct_min RETURN a.ASIN AS asin, b.customer AS cust_id, b.rating as rating'
+        result = transaction.run(cypher, asins=asins, rev_ct_min=rev_ct_min)
 
         try:
             return [{
@@ -554,8 +753,8 @@ class N4J:
     
     @staticmethod
     def _get_titles_from_asins(transaction, asins):
-        cypher = 'MATCH (a:PRODUCT) WHERE a.ASIN IN [%(al)s] RETURN a.ASIN AS asin, a.title AS title' % {'al': '\'' + '\',\''.join(asins) + '\''}
-        result = transaction.run(cypher)
+        cypher = 'MATCH (a:PRODUCT) WHERE a.ASIN IN $asins RETURN a.ASIN AS asin, a.title AS title'
+        result = transaction.run(cypher, asins=asins)
 
         try:
             return [{
@@ -568,8 +767,8 @@ class N4J:
 
     @staticmethod
     def _get_users_rating_average(transaction, usr_ids):
-        cypher = 'MATCH (a:CUSTOMER) WHERE a.Id IN %(cids)s RETURN a.Id as cust_id, a.rating_avg AS rating_avg;' % {'cids': usr_ids}
-        result = transaction.run(cypher)
+        cypher = 'MATCH (a:CUSTOMER) WHERE a.Id IN $usr_ids RETURN a.Id as cust_id, a.rating_avg AS rating_avg;'
+        result = transaction.run(cypher, usr_ids=usr_ids)
         try:
             return [{
                 'cust_id'   : cid,
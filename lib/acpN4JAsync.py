@@ -0,0 +1,142 @@
+import os
+import re
+import asyncio
+import configparser as cfg
+import pandas as pd
+from neo4j import AsyncGraphDatabase as agdb
+
+from acpN4J import N4J, ReplayTransaction, get_query, pivot_ratings, fill_missing_ratings
+
+project_root = re.sub('(?<=Amazon-CoPurchasing).*', '', os.path.abspath('.'))
+config_path = os.path.join(project_root, 'etc', 'config.ini')
+
+config = cfg.ConfigParser()
+config.read(config_path)
+
+
+async def run_replayed(transaction, transaction_fn, *args):
+    # The first call only builds (and validates) the query; the second shapes the fetched records exactly as the sync path does (JR)
+    cypher, params = get_query(transaction_fn, *args)
+
+    result = await transaction.run(cypher, **params)
+    records = [record async for record in result]
+    return transaction_fn(ReplayTransaction(records), *args)
+
+
+class AsyncN4J:
+    '''
+    Coroutine counterpart of N4J on the neo4j async driver.  Each call takes its own session from the pool, so independent
+    lookups can run concurrently, e.g.
+        titles, averages = await asyncio.gather(n4.get_titles_from_asins(asins), n4.get_users_rating_average(user_ids))
+    The driver is bound to the event loop it was created in (JR)
+    '''
+    def __init__(self):
+        self.endpoint = ''.join(['bolt://', config.get('database_connection', 'dbhost'), ':', config.get('database_connection', 'dbport')])
+        self.driver = agdb.driver(
+            self.endpoint,
+            auth=(config.get('database_connection', 'dbuser'), config.get('database_connection', 'dbpass')),
+            max_connection_pool_size=int(config.get('database_connection', 'pool_size')),
+            connection_acquisition_timeout=float(config.get('database_connection', 'acquisition_timeout_s'))
+        )
+        self.database = config.get('database_connection', 'dbname')
+        self.fetch_size = int(config.get('database_connection', 'fetch_size'))
+        self.default_query_limit = int(config.get('app', 'default_query_limit'))
+
+    async def close(self):
+        await self.driver.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def read(self, transaction_fn, *args):
+        # Runs one of N4J's read transaction functions in a session of its own (JR)
+        async with self.driver.session(database=self.database, fetch_size=self.fetch_size) as session:
+            return await session.execute_read(run_replayed, transaction_fn, *args)
+
+    async def get_edge_types(self):
+        result = await self.read(N4J._get_acp_n4_edge_types)
+        return list(set(row['rel_type'] for row in result))
+
+    async def get_node_properties(self, node_label):
+        result = await self.read(N4J._get_node_properties, node_label.upper())
+        return list(set(prop for row in result for y,prop_lst in row[node_label].items() for prop in prop_lst if prop != 'Id'))
+
+    async def get_num_reviews(self, ASIN):
+        return await self.read(N4J._get_num_reviews, ASIN)
+
+    async def get_similar_product(self, ASIN):
+        return await self.read(N4J._get_similar_product, ASIN)
+
+    async def get_user_product_ratings(self, limit=None, replace_nans_with_avg=False):
+        if limit is None:
+            limit = self.default_query_limit
+        result = pivot_ratings(await self.read(N4J._get_user_product_ratings, limit))
+
+        # Conditional replacement on NaN values with each user's average rating (JR)
+        return fill_missing_ratings(result, (await self.get_users_rating_average(list(result.columns))) if replace_nans_with_avg else None)
+
+    async def get_random_customer_node(self, rating_lower=0, review_ct_lower=1, n_users=1):
+        return await self.read(N4J._get_random_customer_node, rating_lower, review_ct_lower, n_users)
+
+    async def get_product_groups(self):
+        return await self.read(N4J._get_product_groups)
+
+    async def get_product_categories(self):
+        return await self.read(N4J._get_product_categories)
+
+    async def get_products_in_groups(self, group_list):
+        return await self.read(N4J._get_products_in_groups, [str(x) for x in group_list])
+
+    async def get_products_in_categories(self, category_list):
+        return await self.read(N4J._get_products_in_categories, category_list)
+
+    async def get_user_product_groups(self, user_id):
+        return list(set(await self.read(N4J._get_user_product_groups, user_id)))
+
+    async def get_user_product_categories(self, user_id):
+        return await self.read(N4J._get_user_product_categories, user_id)
+
+    async def get_user_product_groups_and_categories(self, user_id):
+        result = await self.read(N4J._get_user_product_groups_and_categories, user_id)
+        return {
+            'group'     : list(set(x['group'] for x in result)),
+            'category'  : list(set(x['category'] for x in result))
+        }
+
+    async def get_user_product_peer_groups_and_categories(self, user_id):
+        return await self.read(N4J._get_user_product_peer_groups_and_categories, user_id)
+
+    async def get_cf_set_from_asins(self, asins, limit=None, min_review_ct=3, replace_nans_with_avg=False):
+        if limit is None:
+            limit = self.default_query_limit
+        result = pivot_ratings(await self.read(N4J._get_cf_set_from_asins, [str(x) for x in asins], limit, min_review_ct))
+
+        # Conditional replacement on NaN values with each user's average rating (JR)
+        return fill_missing_ratings(result, (await self.get_users_rating_average(list(result.columns))) if replace_nans_with_avg else None)
+
+    async def get_titles_from_asins(self, asins):
+        return pd.DataFrame(await self.read(N4J._get_titles_from_asins, [str(x) for x in asins]))
+
+    async def get_rating_greater(self, node, prop_key, rating, operand, limit=None):
+        if limit is None:
+            limit = self.default_query_limit
+        # Values compare as numbers, as they did when they were written into the query text (JR)
+        return pd.DataFrame(await self.read(N4J._get_rating_greater, node, prop_key, float(rating), operand, limit))
+
+    async def get_users_rating_average(self, user_ids):
+        return pd.DataFrame(await self.read(N4J._get_users_rating_average, [str(x) for x in user_ids]))
+
+    async def get_cf_inputs(self, asins, limit=None, min_review_ct=3):
+        '''
+        Ratings, customer averages and titles for a set of products.  The ratings and titles are fetched concurrently,
+        then the averages of the customers found, which is two round trips in sequence rather than three (JR)
+        '''
+        ratings, titles = await asyncio.gather(
+            self.get_cf_set_from_asins(asins, limit, min_review_ct),
+            self.get_titles_from_asins(asins)
+        )
+        averages = await self.get_users_rating_average(list(ratings.columns))
+        return ratings, averages, titles
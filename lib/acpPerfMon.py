@@ -6,6 +6,7 @@ import time
 import configparser as cfg
 from datetime import datetime
 from collections import Counter
+from acpWriter import BulkWriter
 
 project_root = re.sub('(?<=Amazon-CoPurchasing).*', '', os.path.abspath('.'))
 config_path = os.path.join(project_root, 'etc', 'config.ini')
@@ -22,8 +23,8 @@ class PerfMon:
     def add_timelog_event(self, action):
         self.timelog += [(time.perf_counter(), action)]
 
-    def increment_counter(self, event):
-        self.counter[event] += 1
+    def increment_counter(self, event, n=1):
+        self.counter[event] += n
 
     def get_all(self):
         return {'timelog': self.timelog, 'event counters': self.counter}
@@ -48,20 +49,18 @@ class PerfMon:
         summary_path = os.path.join(output_path, '%(datestamp)s_summary_%(caller)s.csv' % {'caller':self.measured_fn_name, 'datestamp':datestamp})
 
         # Ensure that the output path exists (JR)
-        if not os.path.exists(output_path):
-            os.mkdir(output_path)
+        os.makedirs(output_path, exist_ok=True)
 
-        with open(timelog_path, 'w', 1, encoding='utf-8') as log:
+        with BulkWriter(timelog_path) as log:
             log.write('timestamp,action\n')
-            for event in self.timelog:
-                log.write('%(ts)s,%(ev)s\n' % ({'ts':str(event[0]), 'ev':str(event[1])}))
+            log.writelines('%(ts)s,%(ev)s\n' % ({'ts':str(event[0]), 'ev':str(event[1])}) for event in self.timelog)
 
-        with open(counts_path, 'w', 1, encoding='utf-8') as log:
+        with BulkWriter(counts_path) as log:
             log.write('event,n\n')
             for event, count in self.counter.items():
                 log.write('%(event)s,%(count)s\n' % ({'event':str(event), 'count':str(count)}))
 
-        with open(summary_path, 'w', 1, encoding='utf-8') as log:
+        with BulkWriter(summary_path) as log:
             log.write('measure,value\n')
             for stat, val in summary.items():
                 log.write('%(stat)s,%(val)s\n' % ({'stat':str(stat), 'val':str(val)}))
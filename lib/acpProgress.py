@@ -0,0 +1,225 @@
+#! /usr/bin/python3
+
+import os
+import re
+import json
+import time
+import threading
+
+# One reporter per process and progress directory, so a pool worker keeps its totals across the tasks it handles (JR)
+reporters = dict()
+
+
+def get_reporter(progress_path, stage, interval=5.0):
+    key = (os.getpid(), progress_path)
+    if key not in reporters:
+        reporters[key] = ProgressReporter(progress_path, stage, interval)
+    return reporters[key]
+
+
+def write_json(path, data):
+    # Written to a temporary file and renamed so that readers never see a partial file (JR)
+    tmp_path = '%(p)s.%(pid)s.tmp' % {'p': path, 'pid': os.getpid()}
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return '--:--:--'
+    seconds = int(seconds)
+    return '%(h)02d:%(m)02d:%(s)02d' % {'h': seconds // 3600, 'm': seconds % 3600 // 60, 's': seconds % 60}
+
+
+class ProgressReporter:
+    '''
+    Progress of one worker process, written to <progress_path>/worker_<pid>.json at most once per interval.
+    Bytes are counted as stored on disk, so compressed inputs report compressed bytes (JR)
+    '''
+    def __init__(self, progress_path, stage, interval=5.0):
+        self.path = os.path.join(progress_path, 'worker_%(pid)s.json' % {'pid': os.getpid()})
+        self.stage = stage
+        self.interval = interval
+        self.started = time.time()
+        self.last_write = 0
+        self.status = 'idle'
+        self.task = None
+        self.task_started = None
+        self.task_bytes = 0
+        self.task_bytes_done = 0
+        self.task_records = 0
+        self.tasks_done = 0
+        self.tasks_skipped = 0
+        self.bytes_done = 0
+        self.bytes_skipped = 0
+        self.records = 0
+        os.makedirs(progress_path, exist_ok=True)
+
+    def start_task(self, task, task_bytes):
+        self.status = 'running'
+        self.task = task
+        self.task_started = time.time()
+        self.task_bytes = task_bytes
+        self.task_bytes_done = 0
+        self.task_records = 0
+        self.write()
+
+    def update(self, n_bytes=0, n_records=0):
+        # Cheap enough to call every few thousand lines; the file is only rewritten once the interval has passed (JR)
+        self.task_bytes_done += n_bytes
+        self.task_records += n_records
+        if time.time() - self.last_write >= self.interval:
+            self.write()
+
+    def finish_task(self, skipped=False, status='idle'):
+        # Skipped tasks are kept apart so that they do not inflate the measured rates (JR)
+        if skipped:
+            self.tasks_skipped += 1
+            self.bytes_skipped += self.task_bytes
+        else:
+            self.tasks_done += 1
+            # Whatever the estimate of bytes read, a finished task has consumed all of its input (JR)
+            self.bytes_done += max(self.task_bytes, self.task_bytes_done)
+            self.records += self.task_records
+        self.status = status
+        self.task = None
+        self.task_bytes = 0
+        self.task_bytes_done = 0
+        self.task_records = 0
+        self.write()
+
+    def fail_task(self):
+        # The failed task is left in place so the progress file shows what the worker was doing (JR)
+        self.status = 'failed'
+        self.write()
+
+    def get_state(self):
+        return {
+            'pid'               : os.getpid(),
+            'stage'             : self.stage,
+            'status'            : self.status,
+            'task'              : self.task,
+            'task_started'      : self.task_started,
+            'task_bytes'        : self.task_bytes,
+            'task_bytes_done'   : min(self.task_bytes_done, self.task_bytes) if self.task_bytes > 0 else self.task_bytes_done,
+            'task_records'      : self.task_records,
+            'tasks_done'        : self.tasks_done,
+            'tasks_skipped'     : self.tasks_skipped,
+            'bytes_done'        : self.bytes_done,
+            'bytes_skipped'     : self.bytes_skipped,
+            'records'           : self.records,
+            'started'           : self.started,
+            'updated'           : time.time()
+        }
+
+    def write(self):
+        self.last_write = time.time()
+        write_json(self.path, self.get_state())
+
+
+class ProgressMonitor(threading.Thread):
+    '''
+    Runs in the parent process while a pool works, combining the workers' progress files into <progress_path>/progress.json
+    and printing one status line per interval.  A running worker whose file has not changed for stall_seconds is reported as stalled (JR)
+    '''
+    def __init__(self, progress_path, stage, tasks_total, bytes_total, interval=5.0, stall_seconds=120.0):
+        super().__init__(daemon=True)
+        self.progress_path = progress_path
+        self.stage = stage
+        self.tasks_total = tasks_total
+        self.bytes_total = bytes_total
+        self.interval = interval
+        self.stall_seconds = stall_seconds
+        self.started = time.time()
+        self.stopped = threading.Event()
+
+        # Files left by the workers of an earlier (resumed) run would otherwise be counted again (JR)
+        os.makedirs(progress_path, exist_ok=True)
+        for f in os.listdir(progress_path):
+            if re.match('^worker_\d+\.json', f):
+                os.remove(os.path.join(progress_path, f))
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.report()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.report(final=True)
+
+    def read_workers(self):
+        workers = list()
+        for f in sorted(os.listdir(self.progress_path)):
+            if re.match('^worker_\d+\.json$', f):
+                try:
+                    with open(os.path.join(self.progress_path, f), 'r', encoding='utf-8') as w:
+                        workers.append(json.load(w))
+                except (OSError, ValueError):
+                    # The worker may be replacing its file at this moment; it is picked up at the next interval (JR)
+                    continue
+        return workers
+
+    def get_summary(self, workers, final=False):
+        now = time.time()
+        elapsed = max(now - self.started, 1e-6)
+        bytes_done = sum(w['bytes_done'] + w['task_bytes_done'] for w in workers)
+        bytes_skipped = sum(w['bytes_skipped'] for w in workers)
+        records = sum(w['records'] + w['task_records'] for w in workers)
+        bytes_remaining = max(self.bytes_total - bytes_done - bytes_skipped, 0)
+        bytes_rate = bytes_done / elapsed
+
+        worker_rates = list()
+        for w in workers:
+            busy = max(w['updated'] - w['started'], 1e-6)
+            stalled = w['status'] == 'running' and now - w['updated'] > self.stall_seconds
+            worker_rates.append({
+                'pid'           : w['pid'],
+                'status'        : 'stalled' if stalled else w['status'],
+                'task'          : w['task'],
+                'task_pct'      : None if w['task_bytes'] == 0 else round(100 * w['task_bytes_done'] / w['task_bytes'], 1),
+                'task_seconds'  : None if w['task'] is None else round(now - w['task_started'], 1),
+                'tasks_done'    : w['tasks_done'],
+                'mb_per_s'      : round((w['bytes_done'] + w['task_bytes_done']) / busy / 1024 / 1024, 3),
+                'records_per_s' : round((w['records'] + w['task_records']) / busy, 1),
+                'last_update_s' : round(now - w['updated'], 1)
+            })
+
+        return {
+            'stage'         : self.stage,
+            'status'        : 'complete' if final else 'running',
+            'updated'       : now,
+            'elapsed_s'     : round(elapsed, 1),
+            'tasks_total'   : self.tasks_total,
+            'tasks_done'    : sum(w['tasks_done'] for w in workers),
+            'tasks_skipped' : sum(w['tasks_skipped'] for w in workers),
+            'bytes_total'   : self.bytes_total,
+            'bytes_done'    : bytes_done,
+            'bytes_skipped' : bytes_skipped,
+            'pct'           : 100.0 if self.bytes_total == 0 else round(100 * (bytes_done + bytes_skipped) / self.bytes_total, 1),
+            'records'       : records,
+            'mb_per_s'      : round(bytes_rate / 1024 / 1024, 3),
+            'records_per_s' : round(records / elapsed, 1),
+            'eta_s'         : 0 if final or bytes_remaining == 0 else (None if bytes_rate == 0 else round(bytes_remaining / bytes_rate, 1)),
+            'stalled'       : [w['pid'] for w in worker_rates if w['status'] == 'stalled'],
+            'workers'       : worker_rates
+        }
+
+    def report(self, final=False):
+        summary = self.get_summary(self.read_workers(), final)
+        write_json(os.path.join(self.progress_path, 'progress.json'), summary)
+
+        print('%(stage)s: %(pct)5.1f%% of %(total).1f MB, %(mbs).2f MB/s, %(rps).0f records/s, %(tasks)s/%(n)s tasks, ETA %(eta)s%(stalled)s' % {
+            'stage'     : self.stage,
+            'pct'       : summary['pct'],
+            'total'     : self.bytes_total / 1024 / 1024,
+            'mbs'       : summary['mb_per_s'],
+            'rps'       : summary['records_per_s'],
+            'tasks'     : summary['tasks_done'] + summary['tasks_skipped'],
+            'n'         : self.tasks_total,
+            'eta'       : format_duration(summary['eta_s']),
+            'stalled'   : '' if len(summary['stalled']) == 0 else ', stalled workers: %(p)s' % {'p': ', '.join(str(x) for x in summary['stalled'])}
+        })
+
+        return summary
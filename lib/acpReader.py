@@ -0,0 +1,31 @@
+#! /usr/bin/python3
+
+import io
+import gzip
+import pyarrow as pa
+
+# File extensions of the compressed formats read and written by the parser (JR)
+compression_extensions = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def get_compression(path):
+    # Compression implied by the file extension, or None for plain text (JR)
+    for compression, ext in compression_extensions.items():
+        if path.endswith(ext):
+            return compression
+    return None
+
+
+def open_text(path, encoding='utf-8', fileobj=None):
+    '''
+    Opens a plain, gzip or zstd text file for line iteration, decompressing as it is read rather than staging a decompressed copy.
+    zstd is read through pyarrow, which the parser already depends on.  Passing an open binary fileobj lets the caller
+    follow progress through the bytes read from disk (JR)
+    '''
+    match get_compression(path):
+        case 'gzip':
+            return gzip.open(path if fileobj is None else fileobj, 'rt', encoding=encoding)
+        case 'zstd':
+            return io.TextIOWrapper(pa.CompressedInputStream(pa.OSFile(path) if fileobj is None else pa.PythonFile(fileobj, mode='r'), 'zstd'), encoding=encoding)
+        case _:
+            return open(path, 'r', 1, encoding) if fileobj is None else io.TextIOWrapper(fileobj, encoding=encoding)
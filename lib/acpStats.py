@@ -0,0 +1,104 @@
+#! /usr/bin/python3
+
+import math
+import numpy as np
+
+
+class RunningStat:
+    '''
+    Incremental count/sum/mean/standard deviation of a numeric series, updated one value at a time.
+    Results match np.mean()/np.std() over the same values so that rounded outputs are unchanged (JR)
+    '''
+    __slots__ = ('n', 'head', 'lanes', 'block', 'mean', 'm2')
+
+    # Series up to this length are kept verbatim and summarised with numpy directly (JR)
+    head_size = 8
+
+    def __init__(self):
+        self.n = 0
+        self.head = list()
+        # Eight summation lanes plus the pending partial block, mirroring numpy's pairwise summation (JR)
+        self.lanes = None
+        self.block = list()
+        # Welford accumulators (JR)
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        value = float(value)
+        self.n += 1
+
+        if self.n <= self.head_size:
+            self.head.append(value)
+
+        self.block.append(value)
+        if len(self.block) == 8:
+            self.lanes = self.block if self.lanes is None else [a + b for a, b in zip(self.lanes, self.block)]
+            self.block = list()
+
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def get_sum(self):
+        # Same addition order as numpy's pairwise sum, which is exact for up to 128 values (JR)
+        if self.lanes is None:
+            total = 0.0
+        else:
+            total = ((self.lanes[0] + self.lanes[1]) + (self.lanes[2] + self.lanes[3])) + ((self.lanes[4] + self.lanes[5]) + (self.lanes[6] + self.lanes[7]))
+
+        for value in self.block:
+            total += value
+
+        return total
+
+    def get_mean(self):
+        if self.n <= self.head_size:
+            return np.mean(self.head)
+        return np.float64(self.get_sum()) / self.n
+
+    def get_std(self):
+        # Population standard deviation, as np.std() (JR)
+        if self.n <= self.head_size:
+            return np.std(self.head)
+        return np.float64(math.sqrt(max(self.m2, 0.0) / self.n))
+
+
+class BatchStat:
+    '''
+    Count/sum/mean/standard deviation of a numeric series that arrives as arrays, e.g. one merge batch at a time.
+    Batch moments are combined with Chan's parallel update so only the accumulators are retained (JR)
+    '''
+    __slots__ = ('n', 'total', 'mean', 'm2')
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        n_b = len(values)
+        if n_b == 0:
+            return
+
+        mean_b = np.mean(values)
+        m2_b = np.sum(np.square(values - mean_b))
+        n = self.n + n_b
+        delta = mean_b - self.mean
+
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * self.n * n_b / n
+        self.total += np.sum(values)
+        self.n = n
+
+    def get_sum(self):
+        return self.total
+
+    def get_mean(self):
+        return np.float64(np.nan) if self.n == 0 else np.float64(self.total) / self.n
+
+    def get_std(self):
+        # Population standard deviation, as np.std() (JR)
+        return np.float64(np.nan) if self.n == 0 else np.float64(math.sqrt(max(self.m2, 0.0) / self.n))
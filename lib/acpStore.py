@@ -0,0 +1,292 @@
+#! /usr/bin/python3
+
+import os
+import re
+import shutil
+import numpy as np
+import pyarrow as pa
+from datetime import date
+import pyarrow.parquet as pq
+import pyarrow.compute as pc
+
+# Repeated strings are dictionary-encoded both in memory and on disk (JR)
+dict_string = pa.dictionary(pa.int32(), pa.string())
+
+# Typed columns for each entity written by the parser (JR)
+entity_schemas = {
+    'product': pa.schema([
+        ('Id', pa.int64()), ('ASIN', pa.string()), ('title', pa.string()), ('group', dict_string), ('salesrank', pa.int64()),
+        ('similar_to', pa.string()), ('similar_to_ct', pa.int32()),
+        ('category_path_ct', pa.int32()), ('category_path_depth_avg', pa.float64()), ('category_path_depth_sd', pa.float64()),
+        ('review_total_ct', pa.int32()), ('review_downloaded_ct', pa.int32()), ('review_rating_avg', pa.float64()), ('review_rating_sd', pa.float64()),
+        ('review_votes_total', pa.int64()), ('review_votes_avg', pa.float64()), ('review_votes_sd', pa.float64()), ('review_mttr', pa.float64()),
+        ('review_helpful_ratio_avg', pa.float64()), ('review_helpful_ratio_sd', pa.float64()),
+        ('review_rating_avg_wtd', pa.float64()), ('review_rating_wtd_avg', pa.float64()), ('review_rating_wtd_sd', pa.float64()),
+        ('customers_unique', pa.int32())
+    ]),
+    # A product's category paths, with Id being the integer id of the path's leaf segment in the category tree (JR)
+    'category': pa.schema([
+        ('product_id', pa.int64()), ('ASIN', pa.string()), ('Id', pa.int64()), ('path', dict_string), ('path_depth', pa.int16())
+    ]),
+    # One row per (segment, parent segment) pair of the category hierarchy, first seen by the worker that wrote the batch (JR)
+    'category_tree': pa.schema([
+        ('Id', pa.int64()), ('parent_id', pa.int64()), ('name', pa.string()), ('path', pa.string()), ('path_depth', pa.int16())
+    ]),
+    'review': pa.schema([
+        ('product_id', pa.int64()), ('ASIN', pa.string()), ('Id', pa.string()), ('review_date', pa.date32()), ('customer', dict_string),
+        ('rating', pa.int8()), ('votes', pa.int32()), ('helpful', pa.int32()), ('helpful_ratio', pa.float64()), ('review_rating_wtd', pa.float64())
+    ])
+}
+
+# Customer data is a projection of the review columns rather than a separately stored copy (JR)
+entity_sources = {'product': 'product', 'category': 'category', 'category_tree': 'category_tree', 'review': 'review', 'customer': 'review'}
+
+
+class ColumnStore:
+    '''
+    Per-batch Parquet files of typed columns, stored as <repo_path>/<entity>_<batch_id>.parquet.
+    Readers request only the columns they need (JR)
+    '''
+    def __init__(self, repo_path, compression='zstd', compact_ids=False):
+        self.repo_path = repo_path
+        self.compression = compression
+        # Review ids are stored as 64-bit integers rather than md5 hex strings; category ids always are (JR)
+        self.compact_ids = compact_ids
+
+    def get_schema(self, entity):
+        schema = entity_schemas[entity_sources[entity]]
+        if self.compact_ids and entity_sources[entity] == 'review':
+            schema = schema.set(schema.get_field_index('Id'), pa.field('Id', pa.int64()))
+        return schema
+
+    def get_batch_path(self, entity, batch_id):
+        return os.path.join(self.repo_path, '%(e)s_%(bid)s.parquet' % {'e': entity_sources[entity], 'bid': batch_id})
+
+    def build_table(self, entity, columns):
+        # Coerce python values to the entity's schema; empty strings are treated as missing (JR)
+        schema = self.get_schema(entity)
+        arrays = list()
+
+        for field in schema:
+            values = columns[field.name]
+            if pa.types.is_integer(field.type):
+                values = [None if x is None or x == '' else int(x) for x in values]
+            elif pa.types.is_floating(field.type):
+                values = [None if x is None or x == '' else float(x) for x in values]
+            elif pa.types.is_date(field.type):
+                # Review dates are parsed in the form YYYY-M-D (JR)
+                values = [x if x is None or isinstance(x, date) else (None if x == '' else date(*[int(y) for y in x.split('-')])) for x in values]
+            else:
+                values = [None if x is None else str(x) for x in values]
+            arrays.append(pa.array(values, type=field.type))
+
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def write_batch(self, entity, batch_id, columns):
+        # Pool workers may create the directory concurrently (JR)
+        os.makedirs(self.repo_path, exist_ok=True)
+
+        table = self.build_table(entity, columns)
+        pq.write_table(table, self.get_batch_path(entity, batch_id), compression=self.compression)
+
+        return table.num_rows
+
+    def list_batches(self, entity):
+        # Sorted batch ids present for the entity (JR)
+        source = entity_sources[entity]
+        if not os.path.exists(self.repo_path):
+            return list()
+
+        batch_ids = [re.findall('(?<=^%(s)s_)[\d_]+(?=\.parquet)' % {'s': source}, f) for f in os.listdir(self.repo_path)]
+        return sorted(x[0] for x in batch_ids if len(x) > 0)
+
+    def read_batch(self, entity, batch_id, columns=None):
+        return pq.read_table(self.get_batch_path(entity, batch_id), columns=columns)
+
+    def iter_batches(self, entity, columns=None):
+        # Yields (batch_id, table) one batch at a time in batch order so callers never hold more than a single batch (JR)
+        for batch_id in self.list_batches(entity):
+            yield batch_id, self.read_batch(entity, batch_id, columns)
+
+    def read_entity(self, entity, columns=None):
+        # All batches for the entity concatenated in batch order, limited to the requested columns (JR)
+        tables = [self.read_batch(entity, b, columns) for b in self.list_batches(entity)]
+        if len(tables) == 0:
+            schema = self.get_schema(entity)
+            return schema.empty_table() if columns is None else pa.schema([schema.field(c) for c in columns]).empty_table()
+
+        return pa.concat_tables(tables, promote_options='permissive')
+
+
+class SortedRuns:
+    '''
+    External aggregation by key: each added table is sorted and spilled to disk as a Parquet run under run_path.
+    iter_chunks() merges the runs so every key's rows are seen together, holding only one record batch per run (JR)
+    '''
+    def __init__(self, run_path, key, compression='zstd', read_rows=65536):
+        self.run_path = run_path
+        self.key = key
+        self.compression = compression
+        self.read_rows = read_rows
+        self.runs = list()
+
+    def add_run(self, table):
+        if table.num_rows == 0:
+            return
+
+        os.makedirs(self.run_path, exist_ok=True)
+
+        # Sorting on the decoded key so that runs compare consistently regardless of each batch's dictionary (JR)
+        if pa.types.is_dictionary(table.schema.field(self.key).type):
+            table = table.set_column(table.schema.get_field_index(self.key), self.key, table.column(self.key).cast(pa.string()))
+
+        run_file = os.path.join(self.run_path, 'run_%(i)s.parquet' % {'i': str(len(self.runs)).zfill(6)})
+        pq.write_table(table.sort_by(self.key), run_file, compression=self.compression)
+        self.runs.append(run_file)
+
+    def iter_chunks(self):
+        '''
+        Yields tables sorted by key, each holding every row for the keys it contains.
+        A record batch is buffered per run; rows below the smallest buffered maximum key of any unfinished run are emitted together (JR)
+        '''
+        readers = [pq.ParquetFile(r).iter_batches(batch_size=self.read_rows) for r in self.runs]
+        buffers = [pa.table({}) for r in self.runs]
+
+        while True:
+            # Top up empty buffers, and any buffer whose rows could all still be followed by the same key (JR)
+            for i, reader in enumerate(readers):
+                if reader is not None and buffers[i].num_rows == 0:
+                    buffers[i] = self.read_next(readers, buffers, i)
+
+            active = [i for i, b in enumerate(buffers) if b.num_rows > 0]
+            if len(active) == 0:
+                return
+
+            # Unread rows of a run can not sort below its last buffered key (JR)
+            bounds = [buffers[i].column(self.key)[-1].as_py() for i in active if readers[i] is not None]
+            watermark = None if len(bounds) == 0 else min(bounds)
+
+            parts = list()
+            for i in active:
+                if watermark is None:
+                    parts.append(buffers[i])
+                    buffers[i] = buffers[i].slice(0, 0)
+                else:
+                    mask = pc.less(buffers[i].column(self.key), watermark)
+                    parts.append(buffers[i].filter(mask))
+                    buffers[i] = buffers[i].filter(pc.invert(mask))
+
+            chunk = pa.concat_tables(parts)
+            if chunk.num_rows > 0:
+                yield chunk.sort_by(self.key)
+            else:
+                # Every buffered row shares the watermark key; read further into the runs that end on it (JR)
+                for i in active:
+                    if readers[i] is not None and buffers[i].column(self.key)[-1].as_py() == watermark:
+                        buffers[i] = pa.concat_tables([buffers[i], self.read_next(readers, buffers, i)])
+
+    def read_next(self, readers, buffers, i):
+        # Next record batch of run i as a table, marking the run finished once it is exhausted (JR)
+        batch = next(readers[i], None)
+        if batch is None:
+            readers[i] = None
+            return buffers[i].slice(0, 0) if buffers[i].num_columns > 0 else pa.table({})
+        return pa.Table.from_batches([batch])
+
+    def clear(self):
+        if os.path.exists(self.run_path):
+            shutil.rmtree(self.run_path)
+        self.runs = list()
+
+
+class SpillingHashSet:
+    '''
+    Set of 64-bit integer keys held in memory as sorted levels, spilled to a sorted .npy run under run_path once they exceed
+    budget_bytes.  add() reports which keys are new, checking every level and every memory-mapped run.  Once there are more
+    than max_runs runs they are compacted into one, so a lookup never probes more than max_runs files (JR)
+    '''
+    def __init__(self, run_path, budget_bytes, max_runs=8):
+        self.run_path = run_path
+        self.budget_bytes = budget_bytes
+        self.max_runs = max_runs
+        self.levels = list()
+        self.runs = list()
+        self.run_idx = 0
+        self.duplicates = 0
+
+    @staticmethod
+    def contains(sorted_values, values):
+        idx = np.searchsorted(sorted_values, values)
+        found = np.zeros(len(values), dtype=bool)
+        in_range = idx < len(sorted_values)
+        found[in_range] = sorted_values[idx[in_range]] == values[in_range]
+        return found
+
+    def add(self, hashes):
+        # Returns a mask over hashes that is True for the first occurrence of each hash not already in the set (JR)
+        hashes = np.asarray(hashes, dtype=np.int64)
+        unique, first_idx = np.unique(hashes, return_index=True)
+
+        new = np.ones(len(unique), dtype=bool)
+        for keys in self.levels + self.runs:
+            new[new] = ~self.contains(keys, unique[new])
+
+        mask = np.zeros(len(hashes), dtype=bool)
+        mask[first_idx[new]] = True
+        self.duplicates += len(hashes) - int(np.sum(mask))
+
+        # Each batch's new keys are a level of their own, merged into the level before while that is no more than twice its
+        # size.  Levels then at least halve in size, so there are O(log n) of them and each key is merged O(log n) times;
+        # inserting into one sorted array instead copies all of it on every batch (JR)
+        if np.any(new):
+            self.levels.append(unique[new])
+        while len(self.levels) > 1 and len(self.levels[-2]) <= 2 * len(self.levels[-1]):
+            self.levels.append(self.merge(self.levels.pop(), self.levels.pop()))
+
+        if sum(x.nbytes for x in self.levels) > self.budget_bytes:
+            self.spill()
+            if len(self.runs) > self.max_runs:
+                self.compact()
+
+        return mask
+
+    @staticmethod
+    def merge(*sorted_values):
+        # Levels hold disjoint keys; the stable sort (timsort) merges the concatenated sorted levels in linear time (JR)
+        return np.sort(np.concatenate(sorted_values), kind='stable')
+
+    def get_run_file(self):
+        self.run_idx += 1
+        return os.path.join(self.run_path, 'run_%(i)s.npy' % {'i': str(self.run_idx).zfill(6)})
+
+    def spill(self):
+        os.makedirs(self.run_path, exist_ok=True)
+
+        run_file = self.get_run_file()
+        np.save(run_file, self.merge(*self.levels))
+        self.runs.append(np.load(run_file, mmap_mode='r'))
+        self.levels = list()
+
+    def compact(self):
+        # Runs hold disjoint keys, so they are copied into one memory-mapped file and sorted there without loading them all (JR)
+        run_file = self.get_run_file()
+        merged = np.lib.format.open_memmap(run_file, mode='w+', dtype=np.int64, shape=(sum(len(x) for x in self.runs),))
+        start = 0
+        for run in self.runs:
+            merged[start:start + len(run)] = run
+            start += len(run)
+        merged.sort()
+        merged.flush()
+        del merged
+
+        old_files = [x.filename for x in self.runs]
+        self.runs = [np.load(run_file, mmap_mode='r')]
+        for f in old_files:
+            os.remove(f)
+
+    def clear(self):
+        self.runs = list()
+        self.run_idx = 0
+        self.levels = list()
+        if os.path.exists(self.run_path):
+            shutil.rmtree(self.run_path)
@@ -0,0 +1,94 @@
+#! /usr/bin/python3
+
+import re
+
+
+class LineTokenizer:
+    '''
+    Classifies a stripped line of amazon-meta.txt using a dispatch table keyed on its first character,
+    replacing the per-line re.findall() calls previously made in Parser.load_split() (JR)
+    '''
+    # Token types (JR)
+    SKIP            = 0
+    BLANK           = 1
+    DISCONTINUED    = 2
+    CATEGORY        = 3
+    REVIEW          = 4
+    PROPERTY        = 5
+
+    # Only these keys are used by the parser; anything else is skipped (JR)
+    property_keys = frozenset(['Id', 'ASIN', 'title', 'group', 'salesrank', 'similar', 'categories', 'reviews'])
+
+    # 'customer' is misspelled as 'cutomer' (missing 's') in the data (JR)
+    review_pattern          = re.compile(r'^(\d{4}-\d{1,2}-\d{1,2})\s+(?:cutomer|customer):\s+(\w+)\s+rating:\s+(\w+)\s+votes:\s+(\w+)\s+helpful:\s+(\w+)')
+    review_date_pattern     = re.compile(r'^\d{4}-\d{1,2}-\d{1,2}')
+    review_fields_pattern   = re.compile(r'(\w+):\s+(\w+|\d+)')
+    review_meta_pattern     = re.compile(r'(?<=\s)(\w+\s*\w*):\s+(\d+)')
+    digits_pattern          = re.compile(r'\d+')
+    # Category path segments are in the form name[id]; names may themselves contain brackets (JR)
+    category_segment_pattern = re.compile(r'^(.*)\[(\d+)\]$')
+
+    def __init__(self):
+        # Dispatch table of first character -> handler; letters fall through to the property handler (JR)
+        self.dispatch = {'#': self._skip, '|': self._category, 'd': self._discontinued}
+        for digit in '0123456789':
+            self.dispatch[digit] = self._review
+
+    def clean(self, line):
+        # Escape backslashes and single quotes, swap misordered comma/quote pairs, escape double quotes, drop tabs, then collapse spacing around colons (JR)
+        # Chained str.replace() calls each run as one C-level scan and return the string untouched when nothing matches (JR)
+        # Measured faster than a single translate() table plus regex pass, which falls back to per-character lookups (JR)
+        return line.strip().replace('\\', '\\\\').replace("'", "\\'").replace(",\"", "\",").replace('"', '\\\"').replace('\t', '').replace('  ', ' ').replace(' :', ':')
+
+    def tokenize(self, line):
+        # Expects a stripped line; returns a (token_type, token) tuple (JR)
+        if line == '':
+            return (self.BLANK, None)
+        return self.dispatch.get(line[0], self._property)(line)
+
+    def _skip(self, line):
+        return (self.SKIP, None)
+
+    def _category(self, line):
+        return (self.CATEGORY, line)
+
+    def _discontinued(self, line):
+        if line.startswith('discontinued product'):
+            return (self.DISCONTINUED, None)
+        return self._property(line)
+
+    def _review(self, line):
+        # Token is (review_date, {'customer', 'rating', 'votes', 'helpful'}) with values kept as strings (JR)
+        m = self.review_pattern.match(line)
+        if m is not None:
+            return (self.REVIEW, (m.group(1), {'customer': m.group(2), 'rating': m.group(3), 'votes': m.group(4), 'helpful': m.group(5)}))
+
+        # Fall back to the generic key/value pattern for irregular review lines (JR)
+        review_date = self.review_date_pattern.match(line)
+        if review_date is not None:
+            return (self.REVIEW, (review_date.group(0), {x:y for x,y in self.review_fields_pattern.findall(line.replace('cutomer', 'customer'))}))
+
+        return self._property(line)
+
+    def _property(self, line):
+        # Token is (key, value) where value is the stripped text after the first colon (JR)
+        idx = line.find(':')
+        if idx > 0:
+            key = line[:idx]
+            if key in self.property_keys:
+                return (self.PROPERTY, (key, line[idx+1:].strip()))
+        return (self.SKIP, None)
+
+    def parse_review_meta(self, line):
+        # Returns {'total': n, 'downloaded': n} from a 'reviews:' line, ignoring the average rating (JR)
+        return {x:int(y) for x,y in self.review_meta_pattern.findall(line.replace('  ', ' ')) if x != 'avg rating'}
+
+    def parse_category_segment(self, segment):
+        # Returns (name, id), with id None when the segment carries no numeric id (JR)
+        m = self.category_segment_pattern.match(segment)
+        if m is None:
+            return (segment, None)
+        return (m.group(1), int(m.group(2)))
+
+    def parse_first_int(self, line):
+        return self.digits_pattern.search(line.replace('  ', ' ')).group(0)